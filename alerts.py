@@ -0,0 +1,205 @@
+"""
+Watchlist และการแจ้งเตือนราคาลด (price-drop alert) ระหว่างบันทึกดีล
+
+ตาราง 'watchlist' เก็บเกมที่ติดตาม (อ้างด้วย gameID หรือ steamAppID) พร้อมเงื่อนไข
+- targetPrice: แจ้งเตือนเมื่อ salePrice <= ราคานี้
+- minSavings: แจ้งเตือนเมื่อ savings (%) >= ค่านี้
+ถ้ากำหนดทั้งสองค่า ดีลต้องผ่านทั้งสองเงื่อนไข
+
+AlertEngine โหลด watchlist ทั้งหมดเป็น dict ใน memory (gameID -> watches, steamAppID -> watches) ครั้งเดียว
+insert_deals_data ส่งเฉพาะดีลที่ salePrice/savings เปลี่ยนใน batch นั้น (หลัง commit) มาให้ evaluate
+แต่ละดีลจึงใช้ dict lookup 2 ครั้ง ต้นทุนขึ้นกับจำนวนดีลที่เปลี่ยน ไม่ใช่จำนวน watch x ขนาดตาราง
+
+ดีลจะถูกแจ้งเตือนเมื่อเพิ่งผ่านเงื่อนไข (ดีลใหม่ หรือราคา/ส่วนลดเดิมยังไม่ผ่าน) หรือผ่านอยู่แล้วแต่ราคาลดลงอีก
+ผลลัพธ์ (Alert) ถูกส่งให้ sink ใดก็ได้ที่มี .append เช่น list, JsonLinesSink, CallbackSink, QueueSink
+"""
+
+import json
+import time
+from dataclasses import dataclass, asdict
+
+from normalize import COLUMN_INDEX
+
+WATCHLIST_TABLE = "watchlist"
+
+WATCHLIST_MIGRATION = [
+    f'''CREATE TABLE IF NOT EXISTS {WATCHLIST_TABLE} (
+        id INTEGER PRIMARY KEY,
+        gameID INTEGER, -- เกมที่ติดตาม (ทุกร้าน)
+        steamAppID INTEGER, -- หรืออ้างด้วย Steam App ID
+        targetPrice REAL, -- แจ้งเตือนเมื่อ salePrice <= ค่านี้
+        minSavings REAL, -- แจ้งเตือนเมื่อ savings >= ค่านี้ (%)
+        createdAt INTEGER NOT NULL,
+        CHECK (gameID IS NOT NULL OR steamAppID IS NOT NULL),
+        CHECK (targetPrice IS NOT NULL OR minSavings IS NOT NULL)
+    )''',
+]
+
+_GAME_ID = COLUMN_INDEX["gameID"]
+_STEAM_APP_ID = COLUMN_INDEX["steamAppID"]
+_DEAL_ID = COLUMN_INDEX["dealID"]
+_TITLE = COLUMN_INDEX["title"]
+_STORE_ID = COLUMN_INDEX["storeID"]
+_SALE_PRICE = COLUMN_INDEX["salePrice"]
+_SAVINGS = COLUMN_INDEX["savings"]
+_LAST_CHANGE = COLUMN_INDEX["lastChange"]
+
+
+@dataclass
+class Watch:
+    """เงื่อนไขของเกมที่ติดตาม 1 รายการ"""
+    id: int
+    gameID: int = None
+    steamAppID: int = None
+    targetPrice: float = None
+    minSavings: float = None
+
+    def matches(self, price, savings):
+        """ราคา/ส่วนลดนี้ผ่านเงื่อนไขหรือไม่ (ค่าที่ไม่ทราบถือว่าไม่ผ่าน)"""
+        if self.targetPrice is not None and (price is None or price > self.targetPrice):
+            return False
+        if self.minSavings is not None and (savings is None or savings < self.minSavings):
+            return False
+        return True
+
+
+@dataclass
+class Alert:
+    """การแจ้งเตือน 1 ครั้ง: ดีลที่ผ่านเงื่อนไขของ watch"""
+    watchID: int
+    dealID: str
+    title: str
+    storeID: int
+    gameID: int
+    steamAppID: int
+    salePrice: float
+    previousPrice: float # None ถ้าเป็นดีลใหม่
+    savings: float
+    lastChange: int
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def add_watch(conn, game_id=None, steam_app_id=None, target_price=None, min_savings=None):
+    """เพิ่มเกมลง watchlist (commit ทันที) คืนค่า id ของ watch"""
+    if game_id is None and steam_app_id is None:
+        raise ValueError("watch needs a gameID or a steamAppID")
+    if target_price is None and min_savings is None:
+        raise ValueError("watch needs a target price or a minimum savings")
+    cursor = conn.execute(
+        f"INSERT INTO {WATCHLIST_TABLE}(gameID, steamAppID, targetPrice, minSavings, createdAt) VALUES (?, ?, ?, ?, ?)",
+        (game_id, steam_app_id, target_price, min_savings, int(time.time())))
+    conn.commit()
+    return cursor.lastrowid
+
+
+def remove_watch(conn, watch_id):
+    """ลบ watch ออกจาก watchlist (commit ทันที) คืนค่า True ถ้าพบ"""
+    cursor = conn.execute(f"DELETE FROM {WATCHLIST_TABLE} WHERE id = ?", (watch_id,))
+    conn.commit()
+    return cursor.rowcount > 0
+
+
+def load_watches(conn):
+    """อ่าน watchlist ทั้งหมด คืนค่า list ของ Watch"""
+    return [Watch(*row) for row in conn.execute(
+        f"SELECT id, gameID, steamAppID, targetPrice, minSavings FROM {WATCHLIST_TABLE} ORDER BY id")]
+
+
+class AlertEngine:
+    """ตรวจดีลที่ราคาเปลี่ยนกับ watchlist ใน memory แล้วส่ง Alert ให้ sink"""
+
+    def __init__(self, conn, sink):
+        self.conn = conn
+        self.sink = sink
+        self.emitted = 0
+        self.reload()
+
+    def reload(self):
+        """โหลด watchlist ใหม่จากฐานข้อมูล (เรียกหลังเพิ่ม/ลบ watch ระหว่างที่ engine ยังใช้งานอยู่)"""
+        self.by_game = {}
+        self.by_steam_app = {}
+        watches = load_watches(self.conn)
+        for watch in watches:
+            if watch.gameID is not None:
+                self.by_game.setdefault(watch.gameID, []).append(watch)
+            if watch.steamAppID is not None:
+                self.by_steam_app.setdefault(watch.steamAppID, []).append(watch)
+        self.size = len(watches)
+
+    def evaluate(self, changes):
+        """
+        ตรวจดีลที่ salePrice/savings เปลี่ยน คืนค่าจำนวน Alert ที่ส่งออก
+
+        changes: iterable ของ (row ตามลำดับ DEAL_COLUMNS, salePrice เดิม, savings เดิม)
+                 ค่าเดิมเป็น None สำหรับดีลใหม่
+        """
+        if not self.size:
+            return 0
+        emitted = 0
+        for row, old_price, old_savings in changes:
+            watches = self.by_game.get(row[_GAME_ID], ())
+            steam_watches = self.by_steam_app.get(row[_STEAM_APP_ID], ())
+            if not watches and not steam_watches:
+                continue
+            price, savings = row[_SALE_PRICE], row[_SAVINGS]
+            notified = set() # watch ที่อ้างทั้ง gameID และ steamAppID แจ้งเตือนครั้งเดียว
+            for watch in (*watches, *steam_watches):
+                if watch.id in notified or not watch.matches(price, savings):
+                    continue
+                was_matching = old_price is not None and watch.matches(old_price, old_savings)
+                if was_matching and not (price is not None and price < old_price):
+                    continue
+                notified.add(watch.id)
+                self.sink.append(Alert(watch.id, row[_DEAL_ID], row[_TITLE], row[_STORE_ID], row[_GAME_ID],
+                                       row[_STEAM_APP_ID], price, old_price, savings, row[_LAST_CHANGE]))
+                emitted += 1
+        self.emitted += emitted
+        return emitted
+
+
+class JsonLinesSink:
+    """sink ที่เขียน Alert ต่อท้ายไฟล์ทีละบรรทัด (JSON) และ flush ทุกครั้ง"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+
+    def append(self, alert):
+        self._file.write(json.dumps(alert.to_dict(), ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class CallbackSink:
+    """sink ที่เรียก callback(alert) ทันที"""
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def append(self, alert):
+        self.callback(alert)
+
+
+class QueueSink:
+    """sink ที่ใส่ Alert ลง queue (เช่น queue.Queue) ให้ thread อื่นนำไปส่งต่อ"""
+
+    def __init__(self, alert_queue):
+        self.queue = alert_queue
+
+    def append(self, alert):
+        self.queue.put(alert)
+
+
+class FanOutSink:
+    """ส่ง Alert เดียวกันให้หลาย sink"""
+
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def append(self, alert):
+        for sink in self.sinks:
+            sink.append(alert)
@@ -0,0 +1,342 @@
+"""
+Analytics engine สำหรับรายงานดีลเกม (analyze_deals_data)
+
+มี 2 engine ที่คืนผลเป็น DealsReport (ไม่ print เอง):
+- run_report_queries: รัน SQL ของรายงานทีละข้อตาม REPORT_QUERIES (12 statement)
+- compute_deals_report: อ่านค่าสรุป (COUNT/SUM ต่อ steamRatingText) จากตาราง deal_report_summary
+  ซึ่ง trigger ของตาราง deals อัปเดตให้ทุกครั้งที่มีการเขียน แล้วใช้ index หาเฉพาะ top-k
+  จึงไม่ต้อง scan ตาราง/ index ทั้งหมดเพื่อหา COUNT, AVG, GROUP BY หรือจุดตัด top 10% อีก
+ทุก query ของทั้งสอง engine ถูกจับเวลาเป็น span 'report.query' ของ instrument (เมื่อเปิดไว้)
+"""
+
+import time
+from dataclasses import dataclass, field, asdict, fields
+
+import instrument
+
+# --- คำสั่ง SQL ของรายงานแต่ละข้อใน analyze_deals_data ---
+# ใช้ร่วมกันระหว่าง run_report_queries, compute_deals_report และ db.explain_report_queries
+TIMESTAMP_2015 = 1420070400
+
+REPORT_QUERIES = {
+    # 1: นับจำนวนดีลทั้งหมด
+    "total_deals": "SELECT COUNT(*) FROM deals",
+    # 2: ดีล 5 อันดับแรกที่มีส่วนลด (savings) สูงสุด
+    "top_savings": "SELECT title, savings, salePrice, normalPrice FROM deals ORDER BY savings DESC LIMIT 5",
+    # 3: ดีล 5 อันดับแรกที่มีคะแนน Metacritic สูงสุด
+    "top_metacritic": "SELECT title, metacriticScore, salePrice FROM deals WHERE metacriticScore IS NOT NULL ORDER BY metacriticScore DESC LIMIT 5",
+    # 4: ดีล 5 อันดับแรกที่มี Steam Rating Percent สูงสุด (และมีจำนวนรีวิวมากพอสมควร)
+    "top_steam_rating": "SELECT title, steamRatingText, steamRatingPercent, steamRatingCount, salePrice FROM deals WHERE steamRatingPercent IS NOT NULL AND steamRatingCount >= 1000 ORDER BY steamRatingPercent DESC, steamRatingCount DESC LIMIT 5",
+    # 5: ค่าเฉลี่ย Steam Rating Percent ของดีลทั้งหมด
+    "avg_steam_rating": "SELECT AVG(steamRatingPercent) FROM deals WHERE steamRatingPercent IS NOT NULL",
+    # 6: จำนวนดีลแยกตาม Steam Rating Text
+    "rating_text_counts": "SELECT steamRatingText, COUNT(*) FROM deals WHERE steamRatingText IS NOT NULL GROUP BY steamRatingText ORDER BY COUNT(*) DESC",
+    # 7: ดีลที่มี Metacritic Score สูงกว่าค่าเฉลี่ย Metacritic Score ทั้งหมด
+    "above_avg_metacritic": """
+            SELECT title, metacriticScore, salePrice
+            FROM deals
+            WHERE metacriticScore IS NOT NULL
+              AND metacriticScore > (SELECT AVG(metacriticScore) FROM deals WHERE metacriticScore IS NOT NULL)
+            ORDER BY metacriticScore DESC
+            LIMIT 10;
+        """,
+    # 8: ดีลที่มี Steam Rating Percent สูงกว่าค่าเฉลี่ยของดีลที่มี Steam Rating Text เดียวกัน
+    "above_avg_steam_rating": """
+            WITH AvgRatings AS (
+                SELECT
+                    steamRatingText,
+                    AVG(steamRatingPercent) as avg_percent
+                FROM deals
+                WHERE steamRatingText IS NOT NULL
+                GROUP BY steamRatingText
+            )
+            SELECT
+                d.title,
+                d.steamRatingText,
+                d.steamRatingPercent,
+                ar.avg_percent
+            FROM deals d
+            JOIN AvgRatings ar ON d.steamRatingText = ar.steamRatingText
+            WHERE d.steamRatingPercent IS NOT NULL
+              AND d.steamRatingPercent > ar.avg_percent
+            ORDER BY d.steamRatingPercent DESC
+            LIMIT 10;
+        """,
+    # 9: ดีลที่มี Metacritic Score สูง (>= 85) และ Steam Rating Percent สูง (>= 90) และส่วนลด >= 70%
+    "high_rated_savings": """
+            SELECT title, metacriticScore, steamRatingPercent, savings, salePrice
+            FROM deals
+            WHERE metacriticScore IS NOT NULL AND metacriticScore >= 85
+              AND steamRatingPercent IS NOT NULL AND steamRatingPercent >= 90
+              AND savings IS NOT NULL AND savings >= 70
+            ORDER BY savings DESC, metacriticScore DESC
+            LIMIT 10;
+        """,
+    # 10a: จำนวนรีวิวขั้นต่ำของกลุ่ม Top 10%
+    "top10_review_cutoff": """
+            SELECT MIN(steamRatingCount)
+            FROM (
+                SELECT steamRatingCount
+                FROM deals
+                WHERE steamRatingCount IS NOT NULL
+                ORDER BY steamRatingCount DESC
+                LIMIT (SELECT CAST(COUNT(*) * 0.1 AS INTEGER) FROM deals WHERE steamRatingCount IS NOT NULL)
+            ) AS Top10PercentCounts;
+        """,
+    # 10b: ดีลที่มีจำนวนรีวิว Steam อยู่ในช่วง Top 10% (parameter: cutoff จาก 10a)
+    "top10_review_count": """
+                SELECT title, steamRatingCount, steamRatingText, steamRatingPercent, salePrice
+                FROM deals
+                WHERE steamRatingCount IS NOT NULL
+                  AND steamRatingCount >= ?
+                ORDER BY steamRatingCount DESC
+                LIMIT 10;
+            """,
+    # 11: ดีลที่ออกก่อนปี 2015 (parameter: timestamp)
+    "released_before": """
+            SELECT title, releaseDate, salePrice
+            FROM deals
+            WHERE releaseDate IS NOT NULL
+              AND releaseDate < ?
+            ORDER BY releaseDate ASC
+            LIMIT 10;
+        """,
+}
+
+# ค่า parameter ตัวอย่างสำหรับ query ที่มี ? (ใช้ตอน EXPLAIN)
+REPORT_SAMPLE_PARAMS = {
+    "top10_review_count": (1000,),
+    "released_before": (TIMESTAMP_2015,),
+}
+
+
+# --- ตารางสรุปสำหรับ compute_deals_report (สร้างโดย schema migration) ---
+# 1 แถวต่อ steamRatingText (hasText = 0 คือกลุ่มที่ steamRatingText เป็น NULL)
+SUMMARY_TABLE = "deal_report_summary"
+
+_SUMMARY_ADD = f'''
+        INSERT INTO {SUMMARY_TABLE}(hasText, category, deals, percentCount, percentSum,
+                                     metacriticCount, metacriticSum, reviewCountDeals)
+        VALUES (NEW.steamRatingText IS NOT NULL, IFNULL(NEW.steamRatingText, ''), 1,
+                NEW.steamRatingPercent IS NOT NULL, IFNULL(NEW.steamRatingPercent, 0),
+                NEW.metacriticScore IS NOT NULL, IFNULL(NEW.metacriticScore, 0),
+                NEW.steamRatingCount IS NOT NULL)
+        ON CONFLICT(hasText, category) DO UPDATE SET
+            deals = deals + 1,
+            percentCount = percentCount + excluded.percentCount,
+            percentSum = percentSum + excluded.percentSum,
+            metacriticCount = metacriticCount + excluded.metacriticCount,
+            metacriticSum = metacriticSum + excluded.metacriticSum,
+            reviewCountDeals = reviewCountDeals + excluded.reviewCountDeals;'''
+
+_SUMMARY_REMOVE = f'''
+        UPDATE {SUMMARY_TABLE} SET
+            deals = deals - 1,
+            percentCount = percentCount - (OLD.steamRatingPercent IS NOT NULL),
+            percentSum = percentSum - IFNULL(OLD.steamRatingPercent, 0),
+            metacriticCount = metacriticCount - (OLD.metacriticScore IS NOT NULL),
+            metacriticSum = metacriticSum - IFNULL(OLD.metacriticScore, 0),
+            reviewCountDeals = reviewCountDeals - (OLD.steamRatingCount IS NOT NULL)
+        WHERE hasText = (OLD.steamRatingText IS NOT NULL) AND category = IFNULL(OLD.steamRatingText, '');'''
+
+# คำนวณตารางสรุปใหม่ทั้งหมดจาก deals (ใช้ตอน migrate และหลัง bulk load ที่ปิด trigger ไว้)
+REBUILD_SUMMARY_SQL = [
+    f"DELETE FROM {SUMMARY_TABLE}",
+    f'''INSERT INTO {SUMMARY_TABLE}
+        SELECT steamRatingText IS NOT NULL, IFNULL(steamRatingText, ''), COUNT(*),
+               COUNT(steamRatingPercent), IFNULL(SUM(steamRatingPercent), 0),
+               COUNT(metacriticScore), IFNULL(SUM(metacriticScore), 0), COUNT(steamRatingCount)
+        FROM deals GROUP BY 1, 2''',
+]
+
+SUMMARY_MIGRATION = [
+    f'''CREATE TABLE IF NOT EXISTS {SUMMARY_TABLE} (
+        hasText INTEGER NOT NULL, -- 0 = steamRatingText เป็น NULL
+        category TEXT NOT NULL, -- steamRatingText ('' ถ้าเป็น NULL)
+        deals INTEGER NOT NULL, -- COUNT(*)
+        percentCount INTEGER NOT NULL, -- COUNT(steamRatingPercent)
+        percentSum INTEGER NOT NULL, -- SUM(steamRatingPercent)
+        metacriticCount INTEGER NOT NULL, -- COUNT(metacriticScore)
+        metacriticSum INTEGER NOT NULL, -- SUM(metacriticScore)
+        reviewCountDeals INTEGER NOT NULL, -- COUNT(steamRatingCount)
+        PRIMARY KEY (hasText, category)
+    ) WITHOUT ROWID''',
+    *REBUILD_SUMMARY_SQL,
+    f"CREATE TRIGGER IF NOT EXISTS trg_deals_summary_insert AFTER INSERT ON deals BEGIN {_SUMMARY_ADD} END",
+    f"CREATE TRIGGER IF NOT EXISTS trg_deals_summary_delete AFTER DELETE ON deals BEGIN {_SUMMARY_REMOVE} END",
+    f'''CREATE TRIGGER IF NOT EXISTS trg_deals_summary_update
+        AFTER UPDATE OF steamRatingText, steamRatingPercent, metacriticScore, steamRatingCount ON deals
+        BEGIN {_SUMMARY_REMOVE} {_SUMMARY_ADD} END''',
+]
+
+
+# SQL ที่ compute_deals_report ใช้แทน query ของ REPORT_QUERIES (ข้ออื่นใช้ REPORT_QUERIES เดิม)
+SUMMARY_QUERIES = {
+    # ค่าสรุปทั้งหมดจาก deal_report_summary
+    "summary_groups": f'''
+            SELECT hasText, category, deals, percentCount, percentSum,
+                   metacriticCount, metacriticSum, reviewCountDeals
+            FROM {SUMMARY_TABLE} WHERE deals > 0
+        ''',
+    # 7: ใช้ค่าเฉลี่ยจากตารางสรุปแทน subquery AVG (parameter: ค่าเฉลี่ย)
+    "above_avg_metacritic": """
+            SELECT title, metacriticScore, salePrice FROM deals
+            WHERE metacriticScore IS NOT NULL AND metacriticScore > ?
+            ORDER BY metacriticScore DESC LIMIT 10
+        """,
+    # 8: อ่านจาก rating สูงสุดลงมา ผู้เรียกหยุดอ่านเองเมื่อได้ครบ 10 แถว (ดู STREAMED_QUERIES)
+    "above_avg_steam_rating": """
+            SELECT title, steamRatingText, steamRatingPercent FROM deals
+            WHERE steamRatingPercent IS NOT NULL AND steamRatingText IS NOT NULL
+            ORDER BY steamRatingPercent DESC
+        """,
+    # 10a: จุดตัด top 10% = ค่าลำดับที่ k จากมากไปน้อย (parameter: k - 1)
+    "top10_review_cutoff": """
+            SELECT steamRatingCount FROM deals WHERE steamRatingCount IS NOT NULL
+            ORDER BY steamRatingCount DESC LIMIT 1 OFFSET ?
+        """,
+}
+
+# ค่า parameter ตัวอย่างของ SUMMARY_QUERIES (ใช้ตอน EXPLAIN)
+SUMMARY_SAMPLE_PARAMS = {
+    "above_avg_metacritic": (75.0,),
+    "top10_review_cutoff": (0,),
+}
+
+# query ที่อ่านผลตามลำดับของ index แล้วหยุดก่อนหมด (ไม่มี LIMIT ใน SQL แต่ไม่อ่านทั้ง index)
+STREAMED_QUERIES = {"above_avg_steam_rating"}
+
+
+def rebuild_report_summary(conn):
+    """คำนวณ deal_report_summary ใหม่จากตาราง deals (ไม่ commit เอง)"""
+    for statement in REBUILD_SUMMARY_SQL:
+        conn.execute(statement)
+
+
+@dataclass
+class DealsReport:
+    """ผลลัพธ์ของรายงานทั้ง 11 ข้อ (แต่ละ list เป็น tuple แบบเดียวกับแถวจาก SQL)"""
+    total_deals: int = 0
+    top_savings: list = field(default_factory=list) # (title, savings, salePrice, normalPrice)
+    top_metacritic: list = field(default_factory=list) # (title, metacriticScore, salePrice)
+    top_steam_rating: list = field(default_factory=list) # (title, text, percent, count, salePrice)
+    avg_steam_rating: float = None
+    rating_text_counts: list = field(default_factory=list) # (steamRatingText, deals)
+    above_avg_metacritic: list = field(default_factory=list) # (title, metacriticScore, salePrice)
+    above_avg_steam_rating: list = field(default_factory=list) # (title, text, percent, avg ของกลุ่ม)
+    high_rated_savings: list = field(default_factory=list) # (title, meta, steam, savings, salePrice)
+    top10_review_cutoff: int = None
+    top10_review_count: list = field(default_factory=list) # (title, count, text, percent, salePrice)
+    released_before: list = field(default_factory=list) # (title, releaseDate, salePrice)
+    engine: str = ""
+    elapsed: float = 0.0 # วินาที
+    cached: bool = False # True ถ้าได้มาจาก report_cache
+
+
+def report_to_payload(report):
+    """แปลง DealsReport เป็น dict ที่แปลงเป็น JSON ได้ (สำหรับเก็บใน report_cache)"""
+    return asdict(report)
+
+
+def report_from_payload(payload):
+    """สร้าง DealsReport กลับจาก dict ของ report_to_payload (แถวที่เป็น list จาก JSON กลับเป็น tuple)"""
+    names = {f.name for f in fields(DealsReport)}
+    values = {
+        name: [tuple(row) for row in value] if isinstance(value, list) else value
+        for name, value in payload.items() if name in names
+    }
+    return DealsReport(**values)
+
+
+def _query(conn, name, params=(), one=False, sql=None):
+    """รัน query ของรายงาน name (SQL จาก REPORT_QUERIES ถ้าไม่กำหนด sql) คืนค่าทุกแถว หรือค่าแรกถ้า one=True"""
+    with instrument.span("report.query", query=name):
+        cursor = conn.execute(sql or REPORT_QUERIES[name], params)
+        if one:
+            row = cursor.fetchone()
+            return row[0] if row else None
+        return cursor.fetchall()
+
+
+def run_report_queries(conn, released_before=TIMESTAMP_2015):
+    """สร้าง DealsReport ด้วยการรัน SQL ของรายงานทีละข้อ (REPORT_QUERIES)"""
+    start = time.perf_counter()
+    report = DealsReport(engine="sql")
+    report.total_deals = _query(conn, "total_deals", one=True)
+    report.top_savings = _query(conn, "top_savings")
+    report.top_metacritic = _query(conn, "top_metacritic")
+    report.top_steam_rating = _query(conn, "top_steam_rating")
+    report.avg_steam_rating = _query(conn, "avg_steam_rating", one=True)
+    report.rating_text_counts = _query(conn, "rating_text_counts")
+    report.above_avg_metacritic = _query(conn, "above_avg_metacritic")
+    report.above_avg_steam_rating = _query(conn, "above_avg_steam_rating")
+    report.high_rated_savings = _query(conn, "high_rated_savings")
+    report.top10_review_cutoff = _query(conn, "top10_review_cutoff", one=True)
+    if report.top10_review_cutoff is not None:
+        report.top10_review_count = _query(conn, "top10_review_count", (report.top10_review_cutoff,))
+    report.released_before = _query(conn, "released_before", (released_before,))
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+def compute_deals_report(conn, released_before=TIMESTAMP_2015):
+    """
+    สร้าง DealsReport จากตาราง deal_report_summary + การค้น top-k ผ่าน index
+
+    ค่าเฉลี่ย/จำนวนทั้งหมดได้จากตารางสรุป (ไม่กี่แถว) จุดตัด top 10% ใช้ OFFSET บน index ของ
+    steamRatingCount และรายงานข้อ 8 อ่าน index ของ steamRatingPercent จากมากไปน้อยจนได้ครบ 10 แถว
+    """
+    start = time.perf_counter()
+    report = DealsReport(engine="summary")
+
+    # ค่าสรุปทั้งหมดจาก deal_report_summary
+    groups = _query(conn, "summary_groups", sql=SUMMARY_QUERIES["summary_groups"])
+    percent_count = percent_sum = meta_count = meta_sum = review_deals = 0
+    category_avg = {}
+    for has_text, category, deals, p_count, p_sum, m_count, m_sum, r_deals in groups:
+        report.total_deals += deals
+        percent_count += p_count
+        percent_sum += p_sum
+        meta_count += m_count
+        meta_sum += m_sum
+        review_deals += r_deals
+        if has_text:
+            report.rating_text_counts.append((category, deals))
+            if p_count:
+                category_avg[category] = p_sum / p_count
+    report.rating_text_counts.sort(key=lambda row: row[1], reverse=True)
+    report.avg_steam_rating = percent_sum / percent_count if percent_count else None
+
+    # top-k ที่ใช้ index อยู่แล้ว
+    report.top_savings = _query(conn, "top_savings")
+    report.top_metacritic = _query(conn, "top_metacritic")
+    report.top_steam_rating = _query(conn, "top_steam_rating")
+    report.high_rated_savings = _query(conn, "high_rated_savings")
+    report.released_before = _query(conn, "released_before", (released_before,))
+
+    # 7: ใช้ค่าเฉลี่ยจากตารางสรุปแทน subquery AVG
+    if meta_count:
+        report.above_avg_metacritic = _query(conn, "above_avg_metacritic", (meta_sum / meta_count,),
+                                             sql=SUMMARY_QUERIES["above_avg_metacritic"])
+
+    # 8: อ่านจาก rating สูงสุดลงมาจนได้ 10 แถวที่สูงกว่าค่าเฉลี่ยของกลุ่มตัวเอง
+    with instrument.span("report.query", query="above_avg_steam_rating"):
+        cursor = conn.execute(SUMMARY_QUERIES["above_avg_steam_rating"])
+        for title, text, percent in cursor:
+            avg = category_avg.get(text)
+            if avg is not None and percent > avg:
+                report.above_avg_steam_rating.append((title, text, percent, avg))
+                if len(report.above_avg_steam_rating) >= 10:
+                    break
+        cursor.close()
+
+    # 10: จุดตัด top 10% = ค่าลำดับที่ k จากมากไปน้อย (k = 10% ของดีลที่มีจำนวนรีวิว)
+    top_k = int(review_deals * 0.1)
+    if top_k > 0:
+        report.top10_review_cutoff = _query(conn, "top10_review_cutoff", (top_k - 1,), one=True,
+                                            sql=SUMMARY_QUERIES["top10_review_cutoff"])
+    if report.top10_review_cutoff is not None:
+        report.top10_review_count = _query(conn, "top10_review_count", (report.top10_review_cutoff,))
+
+    report.elapsed = time.perf_counter() - start
+    return report
@@ -0,0 +1 @@
+"""Benchmarks สำหรับ pipeline ดีลเกม CheapShark (รันด้วย python -m benchmarks.<ชื่อโมดูล> จาก root ของโปรเจกต์)"""
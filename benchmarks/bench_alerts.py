@@ -0,0 +1,104 @@
+"""
+Benchmark ของ alerts.AlertEngine: ต้นทุนการตรวจ watchlist ระหว่าง sync เมื่อจำนวน watch เพิ่มขึ้น
+
+แต่ละรอบ (จำนวน watch 1,000 / 10,000 / 100,000 ...) จะสุ่ม watch บน gameID ของดีลสังเคราะห์
+แล้ว sync ดีลชุดหนึ่งที่ราคาเปลี่ยนผ่าน insert_deals_data พร้อม AlertEngine และวัด
+- Eval (ms): เวลารวมใน AlertEngine.evaluate ของทั้งรอบ และเวลาต่อดีลที่เปลี่ยน (µs)
+- Query/watch (ms): เวลาโดยประมาณของวิธีเดิม (SELECT แยกต่อ watch หลัง sync) วัดจาก watch ตัวอย่าง
+  แล้วคูณด้วยจำนวน watch ทั้งหมด
+
+ตัวอย่าง:
+    python -m benchmarks.bench_alerts --rows 200000 --watches 1000,10000,100000
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+
+import alerts
+import db
+from benchmarks.synthetic import PRICE_POINTS, BASE_TIMESTAMP, generate_deals, reprice_deal
+
+NAIVE_SAMPLE = 50 # จำนวน watch ที่ใช้วัดวิธี query ต่อ watch
+NAIVE_SQL = "SELECT dealID, salePrice FROM deals WHERE gameID = ? AND salePrice <= ? AND isExpired = 0"
+
+
+def _reset_watchlist(conn, count, max_game_id, rng):
+    """แทนที่ watchlist ด้วย watch สุ่ม count รายการ คืนค่า list ของ (gameID, targetPrice)"""
+    watches = [(rng.randint(1000, max_game_id), rng.choice(PRICE_POINTS)) for _ in range(count)]
+    conn.execute(f"DELETE FROM {alerts.WATCHLIST_TABLE}")
+    conn.executemany(f"INSERT INTO {alerts.WATCHLIST_TABLE}(gameID, targetPrice, createdAt) VALUES (?, ?, 0)",
+                     watches)
+    conn.commit()
+    return watches
+
+
+def _timed_engine(conn, timings):
+    """AlertEngine ที่บันทึกเวลาของ evaluate แต่ละครั้งลง timings"""
+    engine = alerts.AlertEngine(conn, [])
+    evaluate = engine.evaluate
+
+    def timed(changes):
+        start = time.perf_counter()
+        emitted = evaluate(changes)
+        timings.append(time.perf_counter() - start)
+        return emitted
+
+    engine.evaluate = timed
+    return engine
+
+
+def run(conn, deals, watch_counts, changed, page_size, seed):
+    rng = random.Random(seed)
+    max_game_id = max(int(deal["gameID"]) for deal in deals)
+    changed_at = BASE_TIMESTAMP
+    results = []
+    for count in watch_counts:
+        watches = _reset_watchlist(conn, count, max_game_id, rng)
+        changed_at += 86400
+        repriced = [reprice_deal(deal, rng, changed_at) for deal in rng.sample(deals, changed)]
+        timings = []
+        engine = _timed_engine(conn, timings)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(0, len(repriced), page_size):
+                db.insert_deals_data(conn, repriced[i:i + page_size], alert_engine=engine)
+        eval_ms = sum(timings) * 1000
+
+        sample = watches[:NAIVE_SAMPLE]
+        start = time.perf_counter()
+        for game_id, target in sample:
+            conn.execute(NAIVE_SQL, (game_id, target)).fetchall()
+        naive_ms = (time.perf_counter() - start) * 1000 / len(sample) * count
+        results.append((f"{count:,}", f"{changed:,}", f"{engine.emitted:,}", f"{eval_ms:.1f}",
+                        f"{eval_ms * 1000 / changed:.2f}", f"{naive_ms:,.0f}"))
+    db.print_table(["Watches", "Changed deals", "Alerts", "Eval (ms)", "Per deal (us)", "Query/watch (ms, est.)"],
+                   results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark watchlist evaluation during ingestion.")
+    parser.add_argument("--rows", type=int, default=200000, help="synthetic deals to start with (default: %(default)s)")
+    parser.add_argument("--watches", default="1000,10000,100000",
+                        help="comma-separated watchlist sizes (default: %(default)s)")
+    parser.add_argument("--changed", type=int, default=20000, help="repriced deals synced per round (default: %(default)s)")
+    parser.add_argument("--page-size", type=int, default=1000, help="deals per insert_deals_data call (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    watch_counts = [int(w) for w in args.watches.split(",")]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Generating {args.rows:,} synthetic deals...")
+        deals = list(generate_deals(args.rows, seed=args.seed))
+        with contextlib.redirect_stdout(io.StringIO()):
+            conn = db.setup_database(os.path.join(tmp, "bench.db"))
+            db.bulk_load_deals(conn, deals, progress_every=0)
+        run(conn, deals, watch_counts, min(args.changed, args.rows), args.page_size, args.seed)
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark ของ analytics engine: รายงานทั้ง 11 ข้อด้วย SQL ทีละข้อ เทียบกับ compute_deals_report
+
+ตัวอย่าง:
+    python -m benchmarks.bench_analytics --rows 1000000
+    python -m benchmarks.bench_analytics --db /tmp/deals_1m.db   # ใช้ฐานข้อมูลที่มีอยู่แล้ว
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import tempfile
+import time
+
+import db
+from benchmarks.synthetic import build_synthetic_database
+
+
+def _time_engine(engine, conn, repeat):
+    """รัน engine ซ้ำ repeat ครั้ง คืนค่า list เวลา (ms)"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        engine(conn)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def run(conn, repeat):
+    rows = conn.execute("SELECT COUNT(*) FROM deals").fetchone()[0]
+    # รอบอุ่นเครื่อง (page cache) ก่อนจับเวลา
+    for engine in db.ANALYTICS_ENGINES.values():
+        engine(conn)
+    results = {name: _time_engine(engine, conn, repeat) for name, engine in db.ANALYTICS_ENGINES.items()}
+    baseline = statistics.median(results["sql"])
+    table = []
+    for name, samples in results.items():
+        median = statistics.median(samples)
+        table.append((name, f"{rows:,}", f"{median:.1f}", f"{min(samples):.1f}", f"{baseline / median:.1f}x"))
+    db.print_table(["Engine", "Rows", "Median (ms)", "Best (ms)", "Speedup vs sql"], table)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark analyze_deals_data engines.")
+    parser.add_argument("--rows", type=int, default=1000000, help="synthetic deals to generate (default: %(default)s)")
+    parser.add_argument("--db", help="use an existing database instead of generating one")
+    parser.add_argument("--repeat", type=int, default=10, help="timed runs per engine (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        with contextlib.redirect_stdout(io.StringIO()):
+            conn = db.setup_database(args.db)
+        run(conn, args.repeat)
+        conn.close()
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Generating {args.rows:,} synthetic deals...")
+        conn = build_synthetic_database(os.path.join(tmp, "bench.db"), args.rows)
+        run(conn, args.repeat)
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark ของ pool.ConnectionPool: read QPS เมื่อเพิ่มจำนวน thread ผู้อ่าน ระหว่างที่มี bulk insert ทำงานพร้อมกัน
+
+แต่ละรอบ (จำนวน thread ผู้อ่าน 1, 2, 4, ...) จะเริ่ม writer thread ที่เขียนดีลสังเคราะห์ใหม่ผ่าน
+db.bulk_load_deals บน writer ของ pool ไม่หยุด แล้วให้ผู้อ่านแต่ละ thread รัน query ของรายงาน
+(top-k / aggregate จาก REPORT_QUERIES ที่ใช้ index) วนไปจนหมดเวลา แล้ววัด
+- Read QPS: จำนวน query ที่เสร็จต่อวินาที (รวมทุก thread) และ speedup เทียบกับ 1 thread
+- Write rows/s: ความเร็วของ bulk insert ระหว่างรอบนั้น
+
+ตัวอย่าง:
+    python -m benchmarks.bench_pool --rows 200000 --threads 1,2,4,8 --seconds 5
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import os
+import tempfile
+import threading
+import time
+
+import db
+import pool
+from analytics import REPORT_QUERIES, REPORT_SAMPLE_PARAMS
+from benchmarks.synthetic import build_synthetic_database, generate_deals
+
+# query ที่ใช้วัด: รายงานที่อ่านผ่าน index (ไม่รวม query ที่ต้องอ่านทั้ง index เช่น top10_review_cutoff)
+READ_QUERIES = ["top_savings", "top_metacritic", "top_steam_rating", "high_rated_savings",
+                "top10_review_count", "released_before", "above_avg_metacritic"]
+
+
+def _writer_loop(connection_pool, stop, start_index, counter):
+    """เขียนดีลใหม่ทีละ chunk จนกว่า stop จะถูก set บันทึกจำนวนดีลที่เขียนลง counter[0]"""
+    def deals():
+        for i, deal in enumerate(generate_deals(10 ** 9, seed=1, start=start_index)):
+            if stop.is_set():
+                return
+            counter[0] = i
+            yield deal
+
+    with connection_pool.writer() as conn:
+        db.bulk_load_deals(conn, deals(), chunk_size=1000, progress_every=0)
+
+
+def _reader_loop(connection_pool, stop, counts, slot):
+    """รัน query ของรายงานวนไปจนกว่า stop จะถูก set นับจำนวน query ใน counts[slot]"""
+    for name in itertools.cycle(READ_QUERIES):
+        if stop.is_set():
+            return
+        connection_pool.query(REPORT_QUERIES[name], REPORT_SAMPLE_PARAMS.get(name, ()))
+        counts[slot] += 1
+
+
+def run_round(connection_pool, threads, seconds, start_index):
+    """วัด 1 รอบ คืนค่า (read QPS, write rows/s, จำนวนดีลที่เขียน)"""
+    stop = threading.Event()
+    written = [0]
+    counts = [0] * threads
+    writer = threading.Thread(target=_writer_loop, args=(connection_pool, stop, start_index, written))
+    readers = [threading.Thread(target=_reader_loop, args=(connection_pool, stop, counts, i)) for i in range(threads)]
+    writer.start()
+    start = time.perf_counter()
+    for reader in readers:
+        reader.start()
+    time.sleep(seconds)
+    stop.set()
+    for reader in readers:
+        reader.join()
+    elapsed = time.perf_counter() - start
+    writer.join()
+    return sum(counts) / elapsed, written[0] / elapsed, written[0]
+
+
+def run(db_path, thread_counts, seconds):
+    results = []
+    start_index = 10 ** 8 # ดีลที่ writer เขียนไม่ซ้ำกับข้อมูลตั้งต้น
+    baseline = None
+    # ปิด output ของ setup_database/bulk_load_deals (redirect_stdout มีผลทั้ง process จึงครอบทั้งการวัด)
+    with contextlib.redirect_stdout(io.StringIO()):
+        connection_pool = pool.ConnectionPool(db_path, readers=max(thread_counts))
+        for threads in thread_counts:
+            qps, write_rate, written = run_round(connection_pool, threads, seconds, start_index)
+            start_index += written + 1
+            baseline = baseline or qps
+            results.append((threads, f"{qps:,.0f}", f"{qps / baseline:.2f}x", f"{write_rate:,.0f}"))
+    connection_pool.close()
+    db.print_table(["Reader threads", "Read QPS", "Speedup", "Write rows/s"], results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark concurrent reads through pool.ConnectionPool during a bulk insert.")
+    parser.add_argument("--rows", type=int, default=200000, help="synthetic deals to start with (default: %(default)s)")
+    parser.add_argument("--db", help="use an existing database instead of generating one (the writer adds synthetic deals to it)")
+    parser.add_argument("--threads", default="1,2,4,8", help="comma-separated reader thread counts (default: %(default)s)")
+    parser.add_argument("--seconds", type=float, default=5.0, help="duration of each round (default: %(default)s)")
+    args = parser.parse_args(argv)
+    thread_counts = [int(t) for t in args.threads.split(",")]
+
+    if args.db:
+        run(args.db, thread_counts, args.seconds)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        print(f"Generating {args.rows:,} synthetic deals...")
+        build_synthetic_database(path, args.rows).close()
+        run(path, thread_counts, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Benchmark ของ deal_price_history: write amplification และ query latency เมื่อประวัติราคาโตขึ้น
+
+จำลองการ sync หลายรอบ แต่ละรอบมีดีลบางส่วนเปลี่ยนราคา แล้ววัด
+- bytes/obs (stored): ขนาดตาราง deal_price_history (จาก dbstat) หารด้วยจำนวนการสังเกต
+- write amp: ไบต์ที่ process เขียนจริงระหว่าง sync (wchar ใน /proc/self/io ซึ่งรวมการอัปเดตแถวและ index ของ deals
+  และ WAL: ทุกหน้าที่แก้ถูกเขียนลงไฟล์ -wal ก่อน แล้วเขียนซ้ำลงไฟล์ฐานข้อมูลตอน checkpoint) ต่อไบต์ข้อมูลเชิงตรรกะ
+  ของการสังเกตราคา (dealKey 8 + observedAt 8 + priceCents 8 = 24 ไบต์)
+- latency ของ get_price_history / get_price_stats (90 วัน) แยก median และ p95
+
+ตัวอย่าง:
+    python -m benchmarks.bench_price_history --deals 20000 --rounds 40
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import db
+import price_history
+from benchmarks.synthetic import generate_deals, reprice_deal, BASE_TIMESTAMP
+
+LOGICAL_OBSERVATION_BYTES = 24
+
+
+def _process_bytes_written():
+    """จำนวนไบต์ที่ process นี้เขียนผ่าน write() ทั้งหมด (None ถ้าไม่ใช่ Linux)"""
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def _history_table_bytes(conn):
+    """ขนาดของตาราง deal_price_history บนดิสก์ (None ถ้า SQLite ไม่มี dbstat)"""
+    try:
+        return conn.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = ?",
+                            (price_history.HISTORY_TABLE,)).fetchone()[0]
+    except Exception:
+        return None
+
+
+def _sync(conn, deals, page_size):
+    """บันทึกดีลทีละหน้าผ่าน insert_deals_data (ปิด output ของแต่ละหน้า)"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(0, len(deals), page_size):
+            db.insert_deals_data(conn, deals[i:i + page_size])
+
+
+def _latency_us(func, deal_ids):
+    """เวลาที่ใช้ต่อ 1 query (ไมโครวินาที) คืนค่า (median, p95)"""
+    samples = []
+    for deal_id in deal_ids:
+        start = time.perf_counter()
+        func(deal_id)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def run(deal_count, rounds, change_fraction, queries, page_size, checkpoint_every, seed):
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        with contextlib.redirect_stdout(io.StringIO()):
+            conn = db.setup_database(os.path.join(tmp, "bench.db"))
+        deals = list(generate_deals(deal_count, seed=seed))
+        _sync(conn, deals, page_size)
+
+        results = []
+        now = BASE_TIMESTAMP
+        for round_no in range(1, rounds + 1):
+            now += 86400
+            changed = rng.sample(range(deal_count), int(deal_count * change_fraction))
+            for i in changed:
+                deals[i] = reprice_deal(deals[i], rng, now)
+            before_obs = conn.execute(f"SELECT COUNT(*) FROM {price_history.HISTORY_TABLE}").fetchone()[0]
+            before_written = _process_bytes_written()
+            start = time.perf_counter()
+            _sync(conn, [deals[i] for i in changed], page_size)
+            elapsed = time.perf_counter() - start
+            after_written = _process_bytes_written()
+            observations = conn.execute(f"SELECT COUNT(*) FROM {price_history.HISTORY_TABLE}").fetchone()[0]
+
+            if round_no % checkpoint_every and round_no != rounds:
+                continue
+            new_obs = observations - before_obs
+            if before_written is not None and new_obs:
+                write_amp = f"{(after_written - before_written) / (new_obs * LOGICAL_OBSERVATION_BYTES):.1f}x"
+            else:
+                write_amp = "n/a"
+            table_bytes = _history_table_bytes(conn)
+            sample_ids = [deals[i]["dealID"] for i in rng.sample(range(deal_count), min(queries, deal_count))]
+            hist_med, hist_p95 = _latency_us(lambda d: price_history.get_price_history(conn, d), sample_ids)
+            stat_med, stat_p95 = _latency_us(
+                lambda d: price_history.get_price_stats(conn, d, start=now - 90 * 86400, end=now), sample_ids)
+            results.append((
+                round_no, observations,
+                f"{table_bytes / observations:.1f}" if table_bytes else "n/a",
+                write_amp,
+                f"{new_obs / elapsed:,.0f}",
+                f"{hist_med:.0f} / {hist_p95:.0f}",
+                f"{stat_med:.0f} / {stat_p95:.0f}",
+            ))
+        conn.close()
+
+    db.print_table(
+        ["Round", "Observations", "Bytes/obs", "Write amp", "Obs/s",
+         "History us (p50/p95)", "Stats 90d us (p50/p95)"],
+        results,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark deal_price_history writes and range queries.")
+    parser.add_argument("--deals", type=int, default=20000, help="number of distinct deals (default: %(default)s)")
+    parser.add_argument("--rounds", type=int, default=40, help="number of simulated syncs (default: %(default)s)")
+    parser.add_argument("--change-fraction", type=float, default=0.5,
+                        help="fraction of deals whose price changes per sync (default: %(default)s)")
+    parser.add_argument("--queries", type=int, default=500, help="queries sampled per checkpoint (default: %(default)s)")
+    parser.add_argument("--page-size", type=int, default=1000, help="deals per insert batch (default: %(default)s)")
+    parser.add_argument("--checkpoint-every", type=int, default=10, help="report every N rounds (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    run(args.deals, args.rounds, args.change_fraction, args.queries, args.page_size, args.checkpoint_every, args.seed)
+
+
+if __name__ == "__main__":
+    main()
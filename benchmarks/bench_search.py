@@ -0,0 +1,117 @@
+"""
+Benchmark ของ search.search_deals เทียบกับ LIKE '%...%' บน title
+
+สุ่มดีลจากฐานข้อมูลแล้วสร้างคำค้น 2 แบบจากชื่อของดีลนั้น
+- substring: ชื่อเกมโดยตัดคำแรกออก (ตัวพิมพ์เล็ก) เช่น "game 12345 remastered"
+- typo: คำค้นเดิมที่พิมพ์ผิด 1 ตัวอักษร (สลับ/ลบ/แทนที่)
+แล้ววัด latency (p50/p95) และ recall@10 (สัดส่วนของคำค้นที่มีดีลชื่อเดียวกับดีลต้นทางอยู่ในผลลัพธ์)
+
+ตัวอย่าง:
+    python -m benchmarks.bench_search --rows 1000000
+    python -m benchmarks.bench_search --db /tmp/deals_1m.db
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import string
+import tempfile
+import time
+
+import db
+import search
+from benchmarks.synthetic import build_synthetic_database
+
+LIKE_SQL = "SELECT dealID, title FROM deals WHERE title LIKE ? ORDER BY dealRating DESC LIMIT ?"
+
+
+def make_queries(conn, count, rng):
+    """คืนค่า list ของ (ชื่อเกมต้นทาง, คำค้น substring, คำค้นที่พิมพ์ผิด)"""
+    total = conn.execute("SELECT MAX(id) FROM deals").fetchone()[0]
+    queries = []
+    while len(queries) < count:
+        row = conn.execute("SELECT dealID, title FROM deals WHERE id = ?", (rng.randint(1, total),)).fetchone()
+        if not row or not row[1]:
+            continue
+        text = " ".join(row[1].lower().split()[1:])
+        if len(text) < 5:
+            continue
+        queries.append((row[1].lower(), text, _typo(text, rng)))
+    return queries
+
+
+def _typo(text, rng):
+    """พิมพ์ผิด 1 ตำแหน่ง: สลับตัวติดกัน ลบ หรือแทนที่ด้วยตัวอักษรอื่น"""
+    i = rng.randrange(1, len(text) - 1)
+    kind = rng.choice(["swap", "delete", "replace"])
+    if kind == "swap":
+        return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+    if kind == "delete":
+        return text[:i] + text[i + 1:]
+    return text[:i] + rng.choice(string.ascii_lowercase) + text[i + 1:]
+
+
+def _measure(queries, func):
+    """รัน func(คำค้น) คืนค่า (p50 ms, p95 ms, recall@10)"""
+    samples = []
+    hits = 0
+    for title, text in queries:
+        start = time.perf_counter()
+        rows = func(text)
+        samples.append((time.perf_counter() - start) * 1000)
+        hits += any(row[1].lower() == title for row in rows)
+    samples.sort()
+    return statistics.median(samples), samples[max(int(len(samples) * 0.95) - 1, 0)], hits / len(queries)
+
+
+def run(conn, count, like_count, seed):
+    rows = conn.execute("SELECT COUNT(*) FROM deals").fetchone()[0]
+    rng = random.Random(seed)
+    queries = make_queries(conn, count, rng)
+    substring = [(title, text) for title, text, _ in queries]
+    typo = [(title, text) for title, _, text in queries]
+
+    def like(text):
+        return conn.execute(LIKE_SQL, (f"%{text}%", search.SEARCH_LIMIT)).fetchall()
+
+    # LIKE scan ทั้งตาราง ใช้คำค้นน้อยกว่าเพื่อไม่ให้ benchmark นานเกินไป
+    cases = [
+        ("LIKE '%q%'", "substring", substring[:like_count], like),
+        ("FTS5 trigram", "substring", substring, lambda t: search.search_deals(conn, t, fuzzy=False)),
+        ("LIKE '%q%'", "typo", typo[:like_count], like),
+        ("FTS5 + fuzzy", "typo", typo, lambda t: search.search_deals(conn, t)),
+    ]
+    table = []
+    for method, kind, case_queries, func in cases:
+        p50, p95, recall = _measure(case_queries, func)
+        table.append((method, kind, f"{rows:,}", len(case_queries), f"{p50:.2f}", f"{p95:.2f}", f"{recall:.0%}"))
+    db.print_table(["Method", "Queries", "Rows", "Count", "p50 (ms)", "p95 (ms)", "Recall@10"], table)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark FTS5 title search against LIKE.")
+    parser.add_argument("--rows", type=int, default=1000000, help="synthetic deals to generate (default: %(default)s)")
+    parser.add_argument("--db", help="use an existing database instead of generating one")
+    parser.add_argument("--queries", type=int, default=200, help="search queries per case (default: %(default)s)")
+    parser.add_argument("--like-queries", type=int, default=20, help="queries for the LIKE full scans (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.db:
+        with contextlib.redirect_stdout(io.StringIO()):
+            conn = db.setup_database(args.db)
+        run(conn, args.queries, args.like_queries, args.seed)
+        conn.close()
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Generating {args.rows:,} synthetic deals...")
+        conn = build_synthetic_database(os.path.join(tmp, "bench.db"), args.rows)
+        run(conn, args.queries, args.like_queries, args.seed)
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
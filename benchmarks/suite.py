@@ -0,0 +1,229 @@
+"""
+ชุด benchmark รวมของ pipeline: setup, ingest, query ของรายงานทีละข้อ และ print_table
+
+แต่ละขนาดข้อมูล (--rows เช่น 10000,100000,1000000) จะสร้างฐานข้อมูลใหม่ใน temp directory แล้ววัด
+- setup: setup_database บนไฟล์ใหม่ (สร้างตาราง + schema migration ทั้งหมด)
+- ingest: insert_deals_data ทีละหน้า (ดีลสังเคราะห์รูปแบบเดียวกับ response ของ API) หรือ bulk_load_deals
+  (--ingest bulk/cold สำหรับข้อมูลหลายล้านแถว) เป็น rows/s จับเวลาเฉพาะการบันทึก ไม่รวมเวลาสร้างดีลสังเคราะห์
+- query: SQL แต่ละข้อใน REPORT_QUERIES และ engine ของ analyze_deals_data ทั้งหมด (median จาก --repeat รอบ)
+- print_table: แสดงดีลจาก cursor (สูงสุด --print-rows แถว) ลง buffer ใน memory เป็น rows/s
+
+ผลลัพธ์ทุกค่าอยู่ใน "metrics" ของไฟล์ JSON (--output) ชื่อที่ลงท้ายด้วย _ms ยิ่งน้อยยิ่งดี
+ชื่อที่ลงท้ายด้วย _per_sec ยิ่งมากยิ่งดี --compare เทียบกับไฟล์ผลลัพธ์เดิมแล้วคืนค่า exit code 1
+ถ้ามีค่าใดแย่ลงเกิน --threshold (ไม่นับเวลาที่ต่ำกว่า NOISE_FLOOR_MS ทั้งสองครั้ง ซึ่งแกว่งได้มากตามธรรมชาติ)
+ไม่มีการเรียก API_URL (ใช้ข้อมูลสังเคราะห์ทั้งหมด)
+
+ตัวอย่าง:
+    python -m benchmarks.suite --rows 10000,100000 --output bench.json
+    python -m benchmarks.suite --rows 10000,100000 --compare bench.json
+    python -m benchmarks.suite --rows 10000000 --ingest cold --repeat 3
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import db
+from analytics import REPORT_QUERIES, REPORT_SAMPLE_PARAMS
+from benchmarks.synthetic import generate_deal_pages
+
+DEFAULT_ROWS = "10000,100000"
+DEFAULT_THRESHOLD = 0.2 # แย่ลงเกิน 20% ถือว่า regression
+NOISE_FLOOR_MS = 1.0 # เวลาที่น้อยกว่านี้ทั้งสองครั้งไม่ถือเป็น regression
+PRINT_QUERY = "SELECT title, salePrice, normalPrice, savings, dealRating, storeID FROM deals ORDER BY salePrice"
+
+
+def _median_ms(func, repeat):
+    """รัน func ซ้ำ repeat ครั้ง (หลังรอบอุ่นเครื่อง 1 ครั้ง) คืนค่า median เป็น ms"""
+    func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def _timed_pages(pages, generate_seconds):
+    """ส่งต่อหน้าจาก pages พร้อมสะสมเวลาที่ใช้สร้างแต่ละหน้าใน generate_seconds[0]"""
+    pages = iter(pages)
+    while True:
+        start = time.perf_counter()
+        page = next(pages, None)
+        generate_seconds[0] += time.perf_counter() - start
+        if page is None:
+            return
+        yield page
+
+
+def _ingest(conn, rows, page_size, seed, mode):
+    """
+    บันทึกดีลสังเคราะห์ผ่าน insert_deals_data ทีละหน้า (mode 'insert') หรือ bulk_load_deals
+    (mode 'bulk', หรือ 'cold' ที่ปิด journal และสร้าง index ใหม่ตอนจบ)
+    คืนค่า (วินาทีที่ใช้บันทึก, วินาทีที่ใช้สร้างดีล)
+    """
+    generate_seconds = [0.0]
+    pages = _timed_pages(generate_deal_pages(rows, page_size=page_size, seed=seed), generate_seconds)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode in ("bulk", "cold"):
+            db.bulk_load_deals(conn, (deal for page in pages for deal in page), cold=mode == "cold", progress_every=0)
+        else:
+            for page in pages:
+                db.insert_deals_data(conn, page)
+    return time.perf_counter() - start - generate_seconds[0], generate_seconds[0]
+
+
+def run_scale(tmp, rows, page_size, repeat, print_rows, seed, ingest="insert"):
+    """วัดทุกขั้นตอนที่ขนาดข้อมูล rows คืนค่า dict ชื่อ metric -> ค่า"""
+    metrics = {}
+    path = os.path.join(tmp, f"bench_{rows}.db")
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        conn = db.setup_database(path)
+    metrics["setup_ms"] = (time.perf_counter() - start) * 1000
+
+    insert_seconds, generate_seconds = _ingest(conn, rows, page_size, seed, ingest)
+    metrics["ingest_ms"] = insert_seconds * 1000
+    metrics["ingest_rows_per_sec"] = rows / insert_seconds
+    metrics["generate_rows_per_sec"] = rows / generate_seconds
+    metrics["db_size_bytes"] = os.path.getsize(path)
+
+    for name, sql in REPORT_QUERIES.items():
+        params = REPORT_SAMPLE_PARAMS.get(name, ())
+        metrics[f"query.{name}_ms"] = _median_ms(lambda: conn.execute(sql, params).fetchall(), repeat)
+    for name, engine in db.ANALYTICS_ENGINES.items():
+        metrics[f"engine.{name}_ms"] = _median_ms(lambda: engine(conn), repeat)
+
+    out = io.StringIO()
+    start = time.perf_counter()
+    shown = db.print_table(["Title", "Sale Price", "Normal Price", "Savings", "Deal Rating", "Store"],
+                           conn.execute(PRINT_QUERY), limit=print_rows, out=out)
+    metrics["print_table_rows_per_sec"] = shown / (time.perf_counter() - start)
+    conn.close()
+    os.remove(path)
+    return metrics
+
+
+def _git_commit():
+    """commit ปัจจุบันของ repo (None ถ้าไม่ใช่ git checkout)"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def lower_is_better(name):
+    """metric ที่ยิ่งน้อยยิ่งดี (เวลา) หรือ None ถ้าไม่ใช่ metric ด้านความเร็ว (เช่น ขนาดไฟล์)"""
+    if name.endswith("_ms"):
+        return True
+    if name.endswith("_per_sec"):
+        return False
+    return None
+
+
+def compare_results(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    เทียบ metrics ของสองผลลัพธ์ คืนค่า list ของ (ชื่อ, ค่าเดิม, ค่าใหม่, อัตราส่วนที่แย่ลง, regression?)
+
+    อัตราส่วนที่แย่ลง > 1 คือช้าลง (เช่น 1.25 = ช้าลง 25%) เทียบเฉพาะ metric ที่มีในทั้งสองไฟล์
+    """
+    rows = []
+    for name, new in current["metrics"].items():
+        old = baseline["metrics"].get(name)
+        lower = lower_is_better(name)
+        if old is None or lower is None or not old or not new:
+            continue
+        slowdown = new / old if lower else old / new
+        noise = lower and max(old, new) < NOISE_FLOOR_MS
+        rows.append((name, old, new, slowdown, slowdown > 1 + threshold and not noise))
+    return rows
+
+
+def print_summary(results):
+    """แสดงผลลัพธ์ของแต่ละขนาดข้อมูลเป็นตาราง"""
+    metrics = results["metrics"]
+    scales = results["config"]["rows"]
+    names = sorted({key.split("/", 1)[1] for key in metrics}, key=lambda n: (n.count("."), n))
+    table = []
+    for name in names:
+        values = [metrics.get(f"{rows}/{name}") for rows in scales]
+        table.append([name] + [f"{v:,.2f}" if v is not None else None for v in values])
+    db.print_table(["Metric"] + [f"{rows:,} rows" for rows in scales], table)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark suite for ingest, report queries and print_table.")
+    parser.add_argument("--rows", default=DEFAULT_ROWS,
+                        help="comma-separated synthetic deal counts, e.g. 10000,1000000,10000000 (default: %(default)s)")
+    parser.add_argument("--ingest", choices=["insert", "bulk", "cold"], default="insert",
+                        help="ingest through insert_deals_data page by page, or bulk_load_deals (cold: --cold load) "
+                             "(default: %(default)s)")
+    parser.add_argument("--page-size", type=int, default=1000, help="deals per insert_deals_data call (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per query/engine (default: %(default)s)")
+    parser.add_argument("--print-rows", type=int, default=100000, help="rows rendered by print_table (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tmp", help="directory for the benchmark databases (default: system temp dir)")
+    parser.add_argument("--output", metavar="FILE", help="write results as JSON to FILE")
+    parser.add_argument("--compare", metavar="FILE", help="compare against a previous --output file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="slowdown ratio above which --compare reports a regression (default: %(default)s)")
+    args = parser.parse_args(argv)
+    scales = [int(r) for r in args.rows.split(",")]
+
+    results = {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "environment": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {"rows": scales, "ingest": args.ingest, "page_size": args.page_size, "repeat": args.repeat,
+                   "print_rows": args.print_rows, "seed": args.seed},
+        "metrics": {},
+    }
+    with tempfile.TemporaryDirectory(dir=args.tmp) as tmp:
+        for rows in scales:
+            print(f"Benchmarking {rows:,} synthetic deals...")
+            metrics = run_scale(tmp, rows, args.page_size, args.repeat, args.print_rows, args.seed, args.ingest)
+            for name, value in metrics.items():
+                results["metrics"][f"{rows}/{name}"] = value
+    print_summary(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to '{args.output}'.")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        comparison = compare_results(results, baseline, args.threshold)
+        regressions = [row for row in comparison if row[4]]
+        print(f"Compared with '{args.compare}' (commit {baseline.get('environment', {}).get('commit')}):")
+        db.print_table(["Metric", "Baseline", "Current", "Slowdown", "Regression"],
+                       [(name, f"{old:,.2f}", f"{new:,.2f}", f"{slowdown:.2f}x", "YES" if bad else "")
+                        for name, old, new, slowdown, bad in comparison])
+        if regressions:
+            print(f"{len(regressions)} metrics regressed by more than {args.threshold:.0%}.")
+            return 1
+        print("No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+สร้างข้อมูลดีลสังเคราะห์ที่มีรูปแบบเหมือน response ของ CheapShark /deals API
+
+ทุกค่าเป็น string เหมือน API จริง (เช่น "salePrice": "4.99") เพื่อให้ผ่านเส้นทางแปลงข้อมูล
+ของ insert_deals_data เหมือนข้อมูลจริง และใช้ seed เพื่อให้ได้ข้อมูลชุดเดิมทุกครั้ง (ไม่ต้องใช้ network)
+"""
+
+import base64
+import hashlib
+import random
+
+STORE_IDS = [1, 2, 3, 7, 8, 11, 13, 15, 21, 23, 24, 25, 27, 28, 29, 30, 31, 33, 34, 35]
+PRICE_POINTS = [0.99, 1.99, 2.99, 4.99, 7.99, 9.99, 14.99, 19.99, 24.99, 29.99, 39.99, 49.99, 59.99, 69.99]
+BASE_TIMESTAMP = 1746000000 # ประมาณ พ.ค. 2025
+
+
+def synthetic_deal_id(index):
+    """dealID ที่ไม่ซ้ำและยาวใกล้เคียงของจริง (base64 ของ hash)"""
+    digest = hashlib.blake2b(index.to_bytes(8, "little"), digest_size=24).digest()
+    return base64.urlsafe_b64encode(digest).decode("ascii")
+
+
+def _steam_rating_text(percent, count):
+    """แปลงเปอร์เซ็นต์/จำนวนรีวิวเป็นข้อความแบบเดียวกับ Steam"""
+    if percent >= 95 and count >= 500:
+        return "Overwhelmingly Positive"
+    if percent >= 80:
+        return "Very Positive" if count >= 50 else "Positive"
+    if percent >= 70:
+        return "Mostly Positive"
+    if percent >= 40:
+        return "Mixed"
+    if percent >= 20:
+        return "Mostly Negative"
+    return "Very Negative" if count >= 50 else "Negative"
+
+
+def make_deal(index, rng):
+    """สร้างดีลสังเคราะห์ 1 รายการ"""
+    normal_price = rng.choice(PRICE_POINTS)
+    savings = rng.uniform(10, 95) if rng.random() < 0.75 else 0.0
+    sale_price = round(normal_price * (1 - savings / 100), 2)
+    has_steam = rng.random() < 0.8
+    steam_count = int(rng.lognormvariate(6, 2)) + 1 if has_steam else 0
+    steam_percent = min(100, max(0, int(rng.gauss(78, 15)))) if has_steam else 0
+    metacritic = rng.randint(50, 97) if rng.random() < 0.6 else 0
+    game_id = 1000 + index // 3 # ประมาณ 3 ร้านต่อเกม
+    title = f"Synthetic Game {game_id}" + rng.choice(["", "", ": Deluxe Edition", " - GOTY", " 2", " Remastered"])
+    return {
+        "internalName": title.upper().replace(" ", "").replace(":", "").replace("-", ""),
+        "title": title,
+        "metacriticLink": f"/game/synthetic-game-{game_id}/" if metacritic else None,
+        "dealID": synthetic_deal_id(index),
+        "storeID": str(STORE_IDS[index % len(STORE_IDS)]),
+        "gameID": str(game_id),
+        "salePrice": f"{sale_price:.2f}",
+        "normalPrice": f"{normal_price:.2f}",
+        "isOnSale": "1" if savings > 0 else "0",
+        "savings": f"{savings:.6f}",
+        "metacriticScore": str(metacritic),
+        "steamRatingText": _steam_rating_text(steam_percent, steam_count) if has_steam else None,
+        "steamRatingPercent": str(steam_percent),
+        "steamRatingCount": str(steam_count),
+        "steamAppID": str(200000 + game_id) if has_steam else None,
+        "releaseDate": rng.randint(946684800, BASE_TIMESTAMP) if rng.random() < 0.95 else 0,
+        "lastChange": BASE_TIMESTAMP - rng.randint(0, 90 * 86400),
+        "dealRating": f"{rng.uniform(0, 10):.1f}",
+        "thumb": f"https://shared.fastly.steamstatic.com/store_item_assets/steam/apps/{200000 + game_id}/capsule_sm_120.jpg",
+    }
+
+
+def generate_deals(count, seed=0, start=0):
+    """Generator ของดีลสังเคราะห์จำนวน count รายการ (index เริ่มที่ start)"""
+    rng = random.Random(seed)
+    for index in range(start, start + count):
+        yield make_deal(index, rng)
+
+
+def generate_deal_pages(count, page_size=1000, seed=0):
+    """แบ่งดีลสังเคราะห์เป็นหน้า (list) ขนาด page_size เหมือนการดึงทีละหน้าจาก API"""
+    page = []
+    for deal in generate_deals(count, seed=seed):
+        page.append(deal)
+        if len(page) >= page_size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def reprice_deal(deal, rng, changed_at):
+    """คืนค่าสำเนาของดีลที่ราคาเปลี่ยน (ใช้จำลองการ sync รอบถัดไป)"""
+    normal_price = float(deal["normalPrice"])
+    savings = rng.uniform(0, 95)
+    updated = dict(deal)
+    updated["savings"] = f"{savings:.6f}"
+    updated["salePrice"] = f"{normal_price * (1 - savings / 100):.2f}"
+    updated["isOnSale"] = "1" if savings > 0 else "0"
+    updated["lastChange"] = changed_at
+    return updated
+
+
+def build_synthetic_database(path, count, page_size=5000, seed=0):
+    """สร้างฐานข้อมูลที่มีดีลสังเคราะห์ count รายการผ่าน setup_database/insert_deals_data (ปิด output)"""
+    import contextlib
+    import io
+    import db
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        conn = db.setup_database(path)
+        for page in generate_deal_pages(count, page_size=page_size, seed=seed):
+            db.insert_deals_data(conn, page)
+    return conn
+
+
+def write_synthetic_archive(path, count, page_size=60, seed=0):
+    """บันทึกดีลสังเคราะห์เป็นไฟล์ archive (JSONL 1 บรรทัด = 1 หน้า, gzip ถ้าลงท้าย .gz) สำหรับ --replay/--bulk-load"""
+    import replay
+
+    replay.save_pages(generate_deal_pages(count, page_size=page_size, seed=seed), path)
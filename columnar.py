@@ -0,0 +1,383 @@
+"""
+Export ตาราง deals (หรือผลลัพธ์ของ query ใดๆ) เป็นไฟล์แบบคอลัมน์สำหรับวิเคราะห์แบบ offline
+
+อ่านผลลัพธ์ทีละ chunk ด้วย fetchmany แล้วเขียนต่อท้ายไฟล์ (ใช้หน่วยความจำตามขนาด chunk เท่านั้น)
+ชนิดของแต่ละคอลัมน์กำหนดก่อนเริ่มเขียนจากค่าทั้งหมดของผลลัพธ์ (ไม่ใช่แค่ chunk แรก) หรือส่ง types= เอง
+- ถ้ามี pyarrow: เขียนไฟล์ Parquet (1 chunk = 1 row group, บีบอัด) หรือ Arrow IPC/Feather v2
+  (fmt="arrow", 1 chunk = 1 record batch, ไม่บีบอัด)
+- ถ้าไม่มี: เขียนโฟลเดอร์ของไฟล์ .npy คอลัมน์ละไฟล์ + manifest.json
+  - REAL -> float64 (NULL = NaN)
+  - INTEGER -> int64 + <คอลัมน์>.nulls.npy (bool) บอกว่าแถวใดเป็น NULL
+  - TEXT ที่มีค่าซ้ำกันมาก (title, steamRatingText และคอลัมน์ TEXT ของ query อื่น) -> รหัส int32
+    ใน dictionary (NULL = -1) + <คอลัมน์>.dict.json ลำดับของค่า string
+  - TEXT ที่แทบไม่ซ้ำ (dealID, thumb ฯลฯ) -> <คอลัมน์>.utf8 (ไบต์ต่อกันทั้งคอลัมน์)
+    + <คอลัมน์>.npy เป็นตำแหน่งสิ้นสุดของแต่ละแถว (int64) + <คอลัมน์>.nulls.npy
+
+load_snapshot เปิดโฟลเดอร์ .npy และไฟล์ Arrow IPC แบบ memory map (np.load(mmap_mode="r") หรือ
+pa.memory_map + pa.ipc.open_file) จึงไม่ copy ข้อมูลเข้า memory ส่วน Parquet ต้อง decode/แตกการบีบอัด
+ลง buffer ใหม่ทั้งไฟล์ (ไฟล์เล็กกว่าแต่ไม่ใช่ zero-copy) ทุกแบบไม่ต้องแตะไฟล์ SQLite ที่กำลังถูกใช้งาน
+"""
+
+import json
+import os
+import struct
+
+import numpy as np
+
+from normalize import DEAL_FIELDS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # pyarrow เป็น optional dependency
+    pa = None
+    pq = None
+
+EXPORT_CHUNK_ROWS = 65536
+MANIFEST_NAME = "manifest.json"
+ARROW_MAGIC = b"ARROW1" # ไบต์แรกของไฟล์ Arrow IPC (Parquet ขึ้นต้นด้วย b"PAR1")
+NPY_HEADER_SIZE = 128 # ขนาด header ของ .npy ที่จองไว้ (แก้ shape ทีหลังได้โดยไม่ต้องย้ายข้อมูล)
+NPY_DTYPES = {"INTEGER": np.dtype("<i8"), "REAL": np.dtype("<f8"), "TEXT": np.dtype("<i4")}
+DEAL_TYPES = dict(DEAL_FIELDS)
+DEAL_TYPES["id"] = "INTEGER"
+# คอลัมน์ TEXT ของ deals ที่เก็บแบบ dictionary (ที่เหลือเก็บแบบ utf8 เพราะแทบไม่มีค่าซ้ำ)
+DICTIONARY_COLUMNS = {"title", "steamRatingText"}
+DEALS_EXPORT_SQL = f"SELECT {', '.join(['id'] + [name for name, _ in DEAL_FIELDS])} FROM deals ORDER BY id"
+
+
+def has_arrow():
+    """True ถ้าติดตั้ง pyarrow ไว้ (export เป็น Parquet/Arrow ได้)"""
+    return pa is not None
+
+
+def _scan_types(conn, sql, params, names):
+    """
+    หาชนิดของคอลัมน์ใน names จากค่าทั้งหมดของผลลัพธ์ (SQL aggregate 1 รอบ ไม่ผ่าน Python ทีละแถว)
+    คืนค่า dict ชื่อ -> (ชนิด, True ถ้าเป็น TEXT ที่มีตัวเลขปนอยู่ซึ่งต้องแปลงเป็น string)
+
+    มี TEXT -> TEXT, มี REAL -> REAL (INTEGER ที่ปนอยู่แปลงเป็น float), มีแต่ INTEGER -> INTEGER,
+    NULL ทั้งคอลัมน์ -> REAL (NaN) ส่วน BLOB export ไม่ได้
+    """
+    checks = []
+    for name in names:
+        quoted = '"' + name.replace('"', '""') + '"'
+        checks.extend(f"MAX(typeof({quoted}) = '{t}')" for t in ("integer", "real", "text", "blob"))
+    query = sql.strip().rstrip(";")
+    flags = conn.execute(f"SELECT {', '.join(checks)} FROM ({query})", params).fetchone()
+    types = {}
+    for i, name in enumerate(names):
+        has_int, has_real, has_text, has_blob = flags[i * 4:i * 4 + 4]
+        if has_blob:
+            raise ValueError(f"column '{name}' contains BLOB values, which cannot be exported")
+        if has_text:
+            types[name] = ("TEXT", bool(has_int or has_real))
+        else:
+            types[name] = ("INTEGER" if has_int and not has_real else "REAL", False)
+    return types
+
+
+def _stringify(values):
+    """แปลงตัวเลขในคอลัมน์ TEXT เป็น string (NULL คงเดิม)"""
+    return tuple(v if v is None or isinstance(v, str) else str(v) for v in values)
+
+
+def _text_encoding(name):
+    """วิธีเก็บคอลัมน์ TEXT: dictionary สำหรับค่าที่ซ้ำกันมาก, utf8 สำหรับคอลัมน์ของ deals ที่ค่าแทบไม่ซ้ำ"""
+    if name in DEAL_TYPES and name not in DICTIONARY_COLUMNS:
+        return "utf8"
+    return "dictionary"
+
+
+def _npy_header(dtype, rows):
+    """header ของไฟล์ .npy (version 1.0) ขนาด NPY_HEADER_SIZE ไบต์พอดี"""
+    header = repr({"descr": dtype.str, "fortran_order": False, "shape": (rows,)})
+    body_size = NPY_HEADER_SIZE - 10 # magic 6 + version 2 + ความยาว header 2
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", body_size) + header.ljust(body_size - 1).encode("latin1") + b"\n"
+
+
+class _NpyColumnWriter:
+    """เขียนคอลัมน์ 1 คอลัมน์ต่อท้ายไฟล์ .npy ทีละ chunk แล้วแก้ shape ใน header ตอนปิด"""
+
+    def __init__(self, path, dtype):
+        self.dtype = dtype
+        self.rows = 0
+        self.file = open(path, "wb")
+        self.file.write(_npy_header(dtype, 0))
+
+    def write(self, array):
+        self.file.write(np.ascontiguousarray(array, dtype=self.dtype).tobytes())
+        self.rows += len(array)
+
+    def close(self):
+        self.file.seek(0)
+        self.file.write(_npy_header(self.dtype, self.rows))
+        self.file.close()
+
+
+class _NpyExporter:
+    """เขียนผลลัพธ์เป็นโฟลเดอร์ของไฟล์ .npy + dictionary + manifest.json"""
+
+    def __init__(self, path, names, types):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.names = names
+        self.types = types
+        self.encodings = [_text_encoding(n) if t == "TEXT" else "plain" for n, t in zip(names, types)]
+        self.rows = 0
+        self.values = {}
+        self.nulls = {}
+        self.dictionaries = {}
+        self.text_files = {}
+        self.text_bytes = {}
+        for name, sql_type, encoding in zip(names, types, self.encodings):
+            column_path = os.path.join(path, name)
+            if encoding == "dictionary":
+                self.values[name] = _NpyColumnWriter(f"{column_path}.npy", NPY_DTYPES["TEXT"])
+                self.dictionaries[name] = {None: -1} # ค่า string -> รหัส (NULL = -1)
+                continue
+            if encoding == "utf8":
+                self.values[name] = _NpyColumnWriter(f"{column_path}.npy", np.dtype("<i8"))
+                self.text_files[name] = open(f"{column_path}.utf8", "wb")
+                self.text_bytes[name] = 0
+            else:
+                self.values[name] = _NpyColumnWriter(f"{column_path}.npy", NPY_DTYPES[sql_type])
+            if sql_type != "REAL": # REAL ใช้ NaN แทน NULL
+                self.nulls[name] = _NpyColumnWriter(f"{column_path}.nulls.npy", np.dtype(bool))
+
+    def write(self, columns):
+        for name, sql_type, encoding, values in zip(self.names, self.types, self.encodings, columns):
+            if encoding == "dictionary":
+                # เพิ่มค่าใหม่ของ chunk นี้ลง dictionary ก่อน แล้วแปลงทั้ง chunk ด้วย lookup อย่างเดียว
+                codes = self.dictionaries[name]
+                for value in set(values).difference(codes):
+                    codes[value] = len(codes) - 1
+                self.values[name].write(np.fromiter(map(codes.__getitem__, values), dtype=np.int32, count=len(values)))
+            elif encoding == "utf8":
+                encoded = [v.encode("utf-8") if v is not None else b"" for v in values]
+                ends = np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)))
+                self.values[name].write(ends + self.text_bytes[name])
+                self.text_files[name].write(b"".join(encoded))
+                self.text_bytes[name] += int(ends[-1]) if len(ends) else 0
+                self.nulls[name].write(np.fromiter((v is None for v in values), dtype=bool, count=len(values)))
+            elif sql_type == "REAL":
+                self.values[name].write(np.array(values, dtype=np.float64)) # None -> NaN
+            else:
+                array = np.array(values, dtype=object)
+                nulls = array == None # noqa: E711 (เทียบทีละช่องของ object array)
+                array[nulls] = 0
+                self.values[name].write(array.astype(np.int64))
+                self.nulls[name].write(nulls)
+        self.rows += len(columns[0])
+
+    def close(self):
+        for writer in list(self.values.values()) + list(self.nulls.values()):
+            writer.close()
+        for text_file in self.text_files.values():
+            text_file.close()
+        for name, codes in self.dictionaries.items():
+            with open(os.path.join(self.path, f"{name}.dict.json"), "w", encoding="utf-8") as f:
+                f.write(json.dumps(list(codes)[1:], ensure_ascii=False)) # ตัด None ที่รหัส -1 ออก
+        manifest = {"format": "npy", "rows": self.rows,
+                    "columns": [{"name": n, "type": t, "encoding": e}
+                                for n, t, e in zip(self.names, self.types, self.encodings)]}
+        with open(os.path.join(self.path, MANIFEST_NAME), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+
+class _ParquetExporter:
+    """เขียนผลลัพธ์เป็นไฟล์ Parquet ผ่าน pyarrow (1 chunk = 1 row group)"""
+
+    ARROW_TYPES = {"INTEGER": "int64", "REAL": "float64", "TEXT": "string"}
+
+    def __init__(self, path, names, types):
+        self.schema = pa.schema([(n, getattr(pa, self.ARROW_TYPES[t])()) for n, t in zip(names, types)])
+        self.writer = self._open(path)
+        self.rows = 0
+
+    def _open(self, path):
+        return pq.ParquetWriter(path, self.schema)
+
+    def write(self, columns):
+        arrays = [pa.array(values, type=field.type) for values, field in zip(columns, self.schema)]
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+        self.rows += len(columns[0])
+
+    def close(self):
+        self.writer.close()
+
+
+class _ArrowExporter(_ParquetExporter):
+    """เขียนผลลัพธ์เป็นไฟล์ Arrow IPC (Feather v2) ไม่บีบอัด (1 chunk = 1 record batch) เปิดกลับแบบ zero-copy ได้"""
+
+    def _open(self, path):
+        return pa.ipc.new_file(path, self.schema)
+
+
+def export_query(conn, sql, path, params=(), fmt="auto", chunk_size=EXPORT_CHUNK_ROWS, types=None):
+    """
+    export ผลลัพธ์ของ sql เป็นไฟล์แบบคอลัมน์ที่ path ทีละ chunk_size แถว
+
+    fmt: "parquet"/"arrow" (ต้องมี pyarrow), "npy" (path เป็นโฟลเดอร์) หรือ "auto" (parquet ถ้ามี pyarrow)
+    types: Optional dict ชื่อคอลัมน์ -> "INTEGER"/"REAL"/"TEXT" (ค่าในคอลัมน์ต้องตรงกับชนิดที่กำหนด)
+           คอลัมน์ที่ไม่ได้กำหนดจะหาชนิดจากค่าทั้งหมดด้วย _scan_types ก่อน export
+           (รัน sql เพิ่ม 1 รอบใน read transaction เดียวกัน จึงเห็นข้อมูลชุดเดียวกับที่ export)
+    คืนค่าจำนวนแถวที่ export
+    """
+    if fmt == "auto":
+        fmt = "parquet" if has_arrow() else "npy"
+    if fmt in ("parquet", "arrow") and not has_arrow():
+        raise RuntimeError(f"{fmt.capitalize()} export requires pyarrow (pip install pyarrow); use the npy format instead")
+    exporter_class = {"parquet": _ParquetExporter, "arrow": _ArrowExporter, "npy": _NpyExporter}[fmt]
+
+    types = dict(types or {})
+    own_transaction = not conn.in_transaction
+    if own_transaction:
+        conn.execute("BEGIN")
+    try:
+        cursor = conn.execute(sql, params)
+        names = [d[0] for d in cursor.description]
+        unknown = [name for name in names if name not in types]
+        scanned = _scan_types(conn, sql, params, unknown) if unknown else {}
+        for name, (sql_type, _) in scanned.items():
+            types[name] = sql_type
+        stringify = [i for i, name in enumerate(names) if scanned.get(name, (None, False))[1]]
+        exporter = exporter_class(path, names, [types[n] for n in names])
+        try:
+            rows = cursor.fetchmany(chunk_size)
+            while rows:
+                columns = list(zip(*rows))
+                for i in stringify:
+                    columns[i] = _stringify(columns[i])
+                exporter.write(columns)
+                rows = cursor.fetchmany(chunk_size)
+        finally:
+            exporter.close()
+    finally:
+        if own_transaction:
+            conn.commit()
+    return exporter.rows
+
+
+def export_deals(conn, path, fmt="auto", chunk_size=EXPORT_CHUNK_ROWS):
+    """export ตาราง deals ทั้งตาราง (ทุกคอลัมน์ของ DEAL_FIELDS + id) เรียงตาม id"""
+    return export_query(conn, DEALS_EXPORT_SQL, path, fmt=fmt, chunk_size=chunk_size, types=DEAL_TYPES)
+
+
+class ColumnSnapshot:
+    """
+    ผลลัพธ์ที่ export ไว้ในรูปแบบ .npy ที่เปิดแบบ memory map
+
+    columns: dict ชื่อ -> numpy array (TEXT แบบ dictionary เป็นรหัส, แบบ utf8 เป็นตำแหน่งสิ้นสุดของแต่ละแถว)
+    nulls: dict ชื่อคอลัมน์ -> bool array ของแถวที่เป็น NULL (คอลัมน์ INTEGER และ TEXT แบบ utf8)
+    dictionaries: dict ชื่อคอลัมน์ TEXT แบบ dictionary -> list ของค่า string ตามรหัส
+    text_data: dict ชื่อคอลัมน์ TEXT แบบ utf8 -> uint8 memmap ของไบต์ทั้งคอลัมน์
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, MANIFEST_NAME), encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.rows = manifest["rows"]
+        self.types = {c["name"]: c["type"] for c in manifest["columns"]}
+        self.encodings = {c["name"]: c["encoding"] for c in manifest["columns"]}
+        self.columns = {}
+        self.nulls = {}
+        self.dictionaries = {}
+        self.text_data = {}
+        for name, encoding in self.encodings.items():
+            column_path = os.path.join(path, name)
+            self.columns[name] = self._map(f"{column_path}.npy")
+            if os.path.exists(f"{column_path}.nulls.npy"):
+                self.nulls[name] = self._map(f"{column_path}.nulls.npy")
+            if encoding == "dictionary":
+                with open(f"{column_path}.dict.json", encoding="utf-8") as f:
+                    self.dictionaries[name] = json.load(f)
+            elif encoding == "utf8":
+                has_bytes = os.path.getsize(f"{column_path}.utf8") > 0
+                self.text_data[name] = (np.memmap(f"{column_path}.utf8", dtype=np.uint8, mode="r")
+                                        if has_bytes else np.zeros(0, dtype=np.uint8))
+
+    def _map(self, file_path):
+        # np.load ใช้ mmap ไม่ได้กับไฟล์ที่ไม่มีข้อมูล (0 แถว)
+        return np.load(file_path, mmap_mode="r") if self.rows else np.load(file_path)
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def decode(self, name, rows=None):
+        """แปลงคอลัมน์ TEXT เป็น list ของ string (None สำหรับ NULL) rows: Optional index/slice ของแถวที่ต้องการ"""
+        selected = slice(None) if rows is None else rows
+        if self.encodings[name] == "dictionary":
+            dictionary = self.dictionaries[name]
+            return [dictionary[c] if c >= 0 else None for c in self.columns[name][selected].tolist()]
+        ends = self.columns[name]
+        starts = np.concatenate(([0], ends[:-1]))[selected].tolist()
+        data = self.text_data[name]
+        return [None if null else bytes(data[start:end]).decode("utf-8")
+                for start, end, null in zip(starts, ends[selected].tolist(), self.nulls[name][selected].tolist())]
+
+
+def load_snapshot(path):
+    """
+    เปิดไฟล์ที่ export ไว้: โฟลเดอร์ .npy -> ColumnSnapshot และ Arrow IPC -> pyarrow.Table (ทั้งสองแบบ zero-copy
+    ผ่าน memory map), Parquet -> pyarrow.Table ที่ decode ลง memory แล้ว
+    """
+    if os.path.isdir(path):
+        return ColumnSnapshot(path)
+    if not has_arrow():
+        raise RuntimeError("Loading Parquet/Arrow snapshots requires pyarrow")
+    with open(path, "rb") as f:
+        magic = f.read(len(ARROW_MAGIC))
+    if magic == ARROW_MAGIC:
+        return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    return pq.read_table(path)
+
+
+def _snapshot_columns(snapshot):
+    """ชื่อและชนิด (INTEGER/REAL/TEXT) ของคอลัมน์ใน snapshot ที่ load_snapshot คืนค่า"""
+    if isinstance(snapshot, ColumnSnapshot):
+        return list(snapshot.types.items())
+    return [(field.name, "TEXT" if pa.types.is_string(field.type) else
+             "REAL" if pa.types.is_floating(field.type) else "INTEGER") for field in snapshot.schema]
+
+
+def _snapshot_values(snapshot, name, sql_type, start, stop):
+    """ค่าของแถว start..stop ในคอลัมน์ name เป็น list ของค่า Python (None สำหรับ NULL)"""
+    if not isinstance(snapshot, ColumnSnapshot):
+        return snapshot.column(name).slice(start, stop - start).to_pylist()
+    if sql_type == "TEXT":
+        return snapshot.decode(name, slice(start, stop))
+    values = snapshot[name][start:stop].tolist()
+    if sql_type == "REAL":
+        return [None if v != v else v for v in values] # NaN -> None
+    return [None if null else v for v, null in zip(values, snapshot.nulls[name][start:stop].tolist())]
+
+
+def verify_snapshot(conn, sql, path, params=(), chunk_size=EXPORT_CHUNK_ROWS):
+    """
+    ตรวจว่า snapshot ที่ path มีค่าตรงกับผลลัพธ์ของ sql ทุกแถว (หลังแปลงเป็นชนิดของคอลัมน์ที่ export ไว้)
+    คืนค่าจำนวนแถวที่ตรวจ หรือ raise ValueError ที่แถว/คอลัมน์แรกที่ไม่ตรงกัน
+    """
+    snapshot = load_snapshot(path)
+    columns = _snapshot_columns(snapshot)
+    casts = {"INTEGER": int, "REAL": float, "TEXT": str}
+    cursor = conn.execute(sql, params)
+    checked = 0
+    rows = cursor.fetchmany(chunk_size)
+    while rows:
+        stop = checked + len(rows)
+        if stop > len(snapshot):
+            raise ValueError(f"snapshot has {len(snapshot):,} rows but the query returns more")
+        for (name, sql_type), expected in zip(columns, zip(*rows)):
+            cast = casts[sql_type]
+            actual = _snapshot_values(snapshot, name, sql_type, checked, stop)
+            for offset, (want, got) in enumerate(zip(expected, actual)):
+                if (None if want is None else cast(want)) != got:
+                    raise ValueError(f"row {checked + offset:,}, column '{name}': expected {want!r}, got {got!r}")
+        checked = stop
+        rows = cursor.fetchmany(chunk_size)
+    if checked != len(snapshot):
+        raise ValueError(f"snapshot has {len(snapshot):,} rows but the query returns {checked:,}")
+    return checked
@@ -15,21 +15,57 @@ Database Explanation:
 Author: [ชยวัฒน์ กาญจนะแก้ว 6610685122]
 """
 
+import re
 import sqlite3
 import requests
 import json
 import datetime # แปลง timestamp เป็นวันที่
+import sys
+import time
+import random
+import email.utils
+import threading
+import argparse
+import atexit
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice, chain
+
+import price_history
+import analytics
+import replay
+import report_cache
+import columnar
+import search
+import alerts
+import instrument
+from normalize import DEAL_COLUMNS, DEAL_FIELDS, normalize_deals
+from analytics import REPORT_QUERIES, REPORT_SAMPLE_PARAMS, TIMESTAMP_2015
 
 # --- กำหนดค่าคงที่ ---
 DATABASE_NAME = "cheapshark_deals.db"
 API_URL = "https://www.cheapshark.com/api/1.0/deals?storeID=1&upperPrice=15"
 
+# --- ค่าคงที่สำหรับโหมด crawl (ดึงดีลทั้งหมดทุกหน้า ทุกร้าน) ---
+DEALS_ENDPOINT = "https://www.cheapshark.com/api/1.0/deals"
+STORES_ENDPOINT = "https://www.cheapshark.com/api/1.0/stores"
+CRAWL_PAGE_SIZE = 60 # pageSize สูงสุดที่ API อนุญาต
+CRAWL_MAX_WORKERS = 4 # จำนวน request ที่ยิงพร้อมกันได้สูงสุด
+CRAWL_MAX_RETRIES = 5
+CRAWL_BACKOFF_BASE = 1.0 # วินาที (เพิ่มแบบ exponential ทุกครั้งที่ retry)
+# ช่วงราคา (lowerPrice, upperPrice) ที่ใช้แบ่งการ crawl; None = ไม่จำกัดราคาสูงสุด
+DEFAULT_PRICE_BANDS = [(0, 5), (5, 10), (10, 15), (15, 30), (30, 60), (60, None)]
+
 # --- ฟังก์ชันสำหรับดึงข้อมูลจาก API ---
 def fetch_deals_from_api(api_url):
     """ดึงข้อมูลดีลเกมจาก CheapShark API"""
     print(f"Fetching data from API: {api_url}")
     try:
-        response = requests.get(api_url)
+        with instrument.span("fetch", url=api_url) as fetch_span:
+            response = requests.get(api_url)
+            fetch_span.set(status=response.status_code, bytes=len(response.content))
+        instrument.count("fetch.requests")
+        instrument.count("fetch.bytes", len(response.content))
         response.raise_for_status() # Raises an HTTPError for bad responses (4xx or 5xx)
         data = response.json()
         print(f"Successfully fetched {len(data)} deals.")
@@ -41,12 +77,302 @@ def fetch_deals_from_api(api_url):
         print("Error decoding JSON response from API.")
         return None
 
+# --- ฟังก์ชันสำหรับ crawl ดีลทั้งหมดแบบหลายหน้าและขนานกัน ---
+def create_http_session(pool_size=CRAWL_MAX_WORKERS):
+    """สร้าง requests.Session ที่ใช้ connection pool ร่วมกันทุก request"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _parse_retry_after(value):
+    """แปลงค่า header Retry-After (วินาที หรือ HTTP-date) เป็นจำนวนวินาทีที่ต้องรอ"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    now = datetime.datetime.now(retry_at.tzinfo)
+    return max(0.0, (retry_at - now).total_seconds())
+
+
+class _RateLimitGate:
+    """จุดหยุดรอร่วมกันของทุก worker เมื่อ API ตอบ 429 (ไม่ให้ worker อื่นยิงซ้ำระหว่างรอ)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._resume_at = 0.0
+
+    def wait(self):
+        with self._lock:
+            delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds):
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+
+def fetch_deals_page(session, params, gate=None, max_retries=CRAWL_MAX_RETRIES, backoff_base=CRAWL_BACKOFF_BASE):
+    """
+    ดึงดีล 1 หน้าจาก DEALS_ENDPOINT พร้อม retry/backoff
+
+    คืนค่า (deals, total_pages) หรือ (None, 0) ถ้าดึงไม่สำเร็จหลัง retry ครบ
+    """
+    for attempt in range(max_retries + 1):
+        if gate:
+            gate.wait()
+        try:
+            with instrument.span("fetch", params=params, attempt=attempt) as fetch_span:
+                response = session.get(DEALS_ENDPOINT, params=params, timeout=30)
+                fetch_span.set(status=response.status_code, bytes=len(response.content))
+            instrument.count("fetch.requests")
+            instrument.count("fetch.bytes", len(response.content))
+        except requests.exceptions.RequestException as e:
+            delay = backoff_base * (2 ** attempt)
+            print(f"Error fetching page {params}: {e}")
+        else:
+            if response.status_code == 429 or response.status_code >= 500:
+                # ใช้ Retry-After ถ้ามี ไม่งั้น backoff แบบ exponential
+                delay = _parse_retry_after(response.headers.get("Retry-After"))
+                if delay is None:
+                    delay = backoff_base * (2 ** attempt)
+                if gate and response.status_code == 429:
+                    gate.pause(delay)
+                print(f"API returned {response.status_code} for page {params}, retrying in {delay:.1f}s")
+            else:
+                try:
+                    response.raise_for_status()
+                    data = response.json()
+                except requests.exceptions.RequestException as e:
+                    print(f"Error fetching page {params}: {e}")
+                    return None, 0
+                except json.JSONDecodeError:
+                    print(f"Error decoding JSON response for page {params}.")
+                    return None, 0
+                try:
+                    total_pages = int(response.headers.get("X-Total-Page-Count", 1))
+                except ValueError:
+                    total_pages = 1
+                return data, total_pages
+        if attempt < max_retries:
+            time.sleep(delay + random.uniform(0, backoff_base)) # jitter กันทุก worker ยิงพร้อมกัน
+    print(f"Giving up on page {params} after {max_retries} retries.")
+    return None, 0
+
+
+def fetch_store_ids(session):
+    """ดึงรายการ storeID ที่ยัง active จาก CheapShark"""
+    try:
+        response = session.get(STORES_ENDPOINT, timeout=30)
+        response.raise_for_status()
+        return [int(store["storeID"]) for store in response.json() if int(store.get("isActive", 1))]
+    except (requests.exceptions.RequestException, json.JSONDecodeError, KeyError, ValueError) as e:
+        print(f"Error fetching store list: {e}")
+        return []
+
+
+def _crawl_params(store_id, band, page_number, page_size):
+    """สร้าง query parameters ของ 1 หน้า"""
+    lower, upper = band
+    params = {"storeID": store_id, "pageNumber": page_number, "pageSize": page_size, "lowerPrice": lower}
+    if upper is not None:
+        params["upperPrice"] = upper
+    return params
+
+
+def crawl_deal_pages(store_ids=None, price_bands=None, page_size=CRAWL_PAGE_SIZE,
+                     max_workers=CRAWL_MAX_WORKERS, session=None, failed_pages=None):
+    """
+    Generator ที่ crawl ดีลทุกหน้าของทุก store/ช่วงราคา แล้ว yield ทีละหน้าทันทีที่ได้ผล
+
+    ใช้ thread pool ขนาด max_workers และจำกัดจำนวน request ที่ค้างอยู่ไม่เกิน max_workers * 2
+    เพื่อไม่ให้หน่วยความจำโตตามขนาด catalogue
+    failed_pages: Optional list ที่จะถูกเติม params ของหน้าที่ดึงไม่สำเร็จ
+    """
+    own_session = session is None
+    if own_session:
+        session = create_http_session(max_workers)
+    if store_ids is None:
+        store_ids = fetch_store_ids(session)
+    if price_bands is None:
+        price_bands = DEFAULT_PRICE_BANDS
+    gate = _RateLimitGate()
+
+    # งานเริ่มต้น: หน้าแรก (pageNumber=0) ของทุก store/ช่วงราคา เพื่อให้รู้จำนวนหน้าทั้งหมด
+    pending_params = [(_crawl_params(s, b, 0, page_size), (s, b)) for s in store_ids for b in price_bands]
+    pending_params.reverse()
+    max_in_flight = max_workers * 2
+    in_flight = {}
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while pending_params or in_flight:
+                while pending_params and len(in_flight) < max_in_flight:
+                    params, key = pending_params.pop()
+                    future = executor.submit(fetch_deals_page, session, params, gate)
+                    in_flight[future] = (params, key)
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    params, key = in_flight.pop(future)
+                    deals, total_pages = future.result()
+                    if deals is None and failed_pages is not None:
+                        failed_pages.append(params)
+                    if params["pageNumber"] == 0 and total_pages > 1:
+                        # เพิ่มหน้าที่เหลือของ store/ช่วงราคานี้เข้าคิว
+                        store_id, band = key
+                        pending_params.extend(
+                            (_crawl_params(store_id, band, n, page_size), key)
+                            for n in range(total_pages - 1, 0, -1)
+                        )
+                    if deals:
+                        yield deals
+    finally:
+        if own_session:
+            session.close()
+
+
+def crawl_deals(conn, store_ids=None, price_bands=None, page_size=CRAWL_PAGE_SIZE, max_workers=CRAWL_MAX_WORKERS,
+                record_path=None, alert_engine=None, rejects=None):
+    """
+    crawl ดีลทั้งหมดแล้ว sync ลงฐานข้อมูลทีละหน้าทันทีที่ดึงได้ (ไม่เก็บทั้งหมดไว้ใน memory)
+
+    ถ้าทุกหน้าดึงสำเร็จ ดีลที่ไม่พบใน crawl ครั้งนี้ (ของ store ที่ crawl) จะถูกทำเครื่องหมายว่าหมดอายุ
+    record_path: Optional ไฟล์สำหรับบันทึกทุกหน้าที่ดึงได้ (JSONL/.gz) เพื่อ replay ภายหลัง
+    alert_engine: Optional alerts.AlertEngine (ดู insert_deals_data)
+    rejects: Optional reject sink (ดู insert_deals_data)
+    คืนค่า SyncStats
+    """
+    start = time.perf_counter()
+    session = create_http_session(max_workers)
+    try:
+        if store_ids is None:
+            store_ids = fetch_store_ids(session)
+        failed_pages = []
+        pages = crawl_deal_pages(store_ids, price_bands, page_size, max_workers,
+                                 session=session, failed_pages=failed_pages)
+        if record_path:
+            pages = replay.record_pages(pages, record_path)
+        # expire เฉพาะเมื่อ crawl ครบทุกช่วงราคาและไม่มีหน้าไหนล้มเหลว
+        full_crawl = price_bands is None
+        stats = sync_deals(conn, pages, full_crawl=full_crawl, store_ids=store_ids,
+                           can_expire=lambda: not failed_pages, alert_engine=alert_engine, rejects=rejects)
+    finally:
+        session.close()
+    elapsed = time.perf_counter() - start
+    if failed_pages:
+        print(f"Warning: {len(failed_pages)} pages failed; skipped marking missing deals as expired.")
+    print(f"Crawl complete in {elapsed:.1f}s: {stats}")
+    return stats
+
 # --- ฟังก์ชันสำหรับตั้งค่าฐานข้อมูล SQLite ---
-def setup_database(db_name):
-    """สร้างการเชื่อมต่อและตารางในฐานข้อมูล SQLite สำหรับดีลเกม"""
+# PRAGMA ที่ตั้งทุกครั้งที่เปิด connection
+# WAL ให้อ่านได้ระหว่างเขียน, synchronous=NORMAL ปลอดภัยเมื่อใช้กับ WAL และ fsync น้อยกว่า FULL มาก
+CONNECTION_PRAGMAS = [
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("mmap_size", 256 * 1024 * 1024), # อ่านไฟล์ผ่าน memory map สูงสุด 256 MB
+    ("cache_size", -64 * 1024), # ค่าลบ = KiB (64 MB page cache)
+    ("temp_store", "MEMORY"), # temp B-tree สำหรับ ORDER BY / GROUP BY อยู่ใน RAM
+]
+
+# Schema migrations แบบมีเวอร์ชัน (เก็บเวอร์ชันปัจจุบันใน PRAGMA user_version)
+# แต่ละรายการคือ (version, คำอธิบาย, list ของคำสั่ง SQL) และต้องเรียงตาม version
+SCHEMA_MIGRATIONS = [
+    (1, "indexes for analyze_deals_data reports", [
+        # 2, 9: ORDER BY savings DESC (, metacriticScore DESC)
+        "CREATE INDEX IF NOT EXISTS idx_deals_savings ON deals(savings, metacriticScore)",
+        # 3, 7: Metacritic top-N และ AVG (covering index, เฉพาะแถวที่มีคะแนน)
+        "CREATE INDEX IF NOT EXISTS idx_deals_metacritic ON deals(metacriticScore) WHERE metacriticScore IS NOT NULL",
+        # 4, 5, 8: ORDER BY steamRatingPercent DESC, steamRatingCount DESC และ AVG(steamRatingPercent)
+        "CREATE INDEX IF NOT EXISTS idx_deals_steam_percent ON deals(steamRatingPercent, steamRatingCount) "
+        "WHERE steamRatingPercent IS NOT NULL",
+        # 6, 8: GROUP BY steamRatingText พร้อม AVG(steamRatingPercent) โดยไม่ต้องอ่านตาราง
+        "CREATE INDEX IF NOT EXISTS idx_deals_rating_text ON deals(steamRatingText, steamRatingPercent) "
+        "WHERE steamRatingText IS NOT NULL",
+        # 10: top 10% ตามจำนวนรีวิว
+        "CREATE INDEX IF NOT EXISTS idx_deals_rating_count ON deals(steamRatingCount) WHERE steamRatingCount IS NOT NULL",
+        # 11: ดีลที่ออกก่อนปีที่กำหนด เรียงตามวันที่
+        "CREATE INDEX IF NOT EXISTS idx_deals_release ON deals(releaseDate) WHERE releaseDate IS NOT NULL",
+    ]),
+    (2, "report summary table maintained by triggers", analytics.SUMMARY_MIGRATION),
+    (3, "sale price index for streaming deal listings", [
+        # print_deals_under: WHERE salePrice < ? ORDER BY salePrice อ่านตาม index ได้ทันทีโดยไม่ต้อง sort ทั้งผลลัพธ์
+        "CREATE INDEX IF NOT EXISTS idx_deals_sale_price ON deals(salePrice)",
+    ]),
+    (4, "data version counter and report cache", report_cache.CACHE_MIGRATION),
+    (5, "full-text title search index", search.SEARCH_MIGRATION),
+    (6, "watchlist for price-drop alerts", alerts.WATCHLIST_MIGRATION),
+]
+
+
+def configure_connection(conn):
+    """ตั้งค่า PRAGMA ด้านประสิทธิภาพให้ connection"""
+    for name, value in CONNECTION_PRAGMAS:
+        conn.execute(f"PRAGMA {name} = {value}")
+
+
+def migrate_schema(conn):
+    """
+    รัน schema migration ที่ยังไม่ได้รัน (เทียบกับ PRAGMA user_version) ทีละเวอร์ชันใน transaction ของตัวเอง
+
+    ถ้ามี migration ถูกรัน จะรัน ANALYZE เพื่อให้ query planner มีสถิติของ index ใหม่
+    คืนค่าเวอร์ชันของ schema หลัง migrate
+    """
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    applied = False
+    for version, description, statements in SCHEMA_MIGRATIONS:
+        if version <= current:
+            continue
+        print(f"Applying schema migration {version}: {description}")
+        conn.execute("BEGIN")
+        try:
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        current = version
+        applied = True
+    if applied:
+        conn.execute("ANALYZE")
+        conn.commit()
+    return current
+
+
+def check_deal_columns(cursor):
+    """
+    ตรวจว่าตาราง deals มีทุกคอลัมน์ของ DEAL_FIELDS ด้วยชนิดเดียวกัน (PRAGMA table_info)
+    DEAL_FIELDS ใช้สร้าง INSERT/UPSERT และแปลงชนิดข้อมูล จึงต้องตรงกับ CREATE TABLE deals ใน setup_database
+    """
+    declared = {row[1]: row[2].upper() for row in cursor.execute("PRAGMA table_info(deals)")}
+    mismatched = [f"{name} {sql_type} (table: {declared.get(name, 'missing')})"
+                  for name, sql_type in DEAL_FIELDS if declared.get(name) != sql_type]
+    if mismatched:
+        raise sqlite3.DatabaseError(f"deals table does not match DEAL_FIELDS: {', '.join(mismatched)}")
+
+
+def setup_database(db_name, **connect_options):
+    """
+    สร้างการเชื่อมต่อและตารางในฐานข้อมูล SQLite สำหรับดีลเกม
+
+    connect_options: Optional argument เพิ่มเติมของ sqlite3.connect (เช่น check_same_thread ที่ pool.py ใช้)
+    """
     conn = None
     try:
-        conn = sqlite3.connect(db_name)
+        conn = sqlite3.connect(db_name, **connect_options)
+        configure_connection(conn)
         cursor = conn.cursor()
 
         # สร้างตาราง deals ถ้ายังไม่มี
@@ -72,10 +398,24 @@ def setup_database(db_name):
                 releaseDate INTEGER, -- Timestamp (ตัวเลข)
                 lastChange INTEGER, -- Timestamp (ตัวเลข)
                 dealRating REAL, -- คะแนนดีล (ทศนิยม)
-                thumb TEXT -- URL รูปภาพ
+                thumb TEXT, -- URL รูปภาพ
+                isExpired INTEGER NOT NULL DEFAULT 0, -- 1 = ไม่พบดีลนี้แล้วใน full crawl ล่าสุด
+                expiredAt INTEGER -- Timestamp ที่ถูกทำเครื่องหมายว่าหมดอายุ
             )
         ''')
+        # ฐานข้อมูลเก่าที่สร้างก่อนมีคอลัมน์ isExpired/expiredAt
+        existing_columns = {row[1] for row in cursor.execute("PRAGMA table_info(deals)")}
+        if "isExpired" not in existing_columns:
+            cursor.execute("ALTER TABLE deals ADD COLUMN isExpired INTEGER NOT NULL DEFAULT 0")
+        if "expiredAt" not in existing_columns:
+            cursor.execute("ALTER TABLE deals ADD COLUMN expiredAt INTEGER")
+        check_deal_columns(cursor)
+
+        # ตารางประวัติราคา (append-only)
+        price_history.create_price_history_table(cursor)
         conn.commit()
+
+        migrate_schema(conn)
         print(f"Database '{db_name}' and table 'deals' are ready.")
         return conn
     except sqlite3.Error as e:
@@ -85,322 +425,832 @@ def setup_database(db_name):
         return None
 
 # --- ฟังก์ชันสำหรับนำข้อมูลดีลเข้าฐานข้อมูล ---
-def insert_deals_data(conn, deals_list):
-    """เพิ่มข้อมูลดีลเกมลงในตาราง deals"""
+@dataclass
+class SyncStats:
+    """สรุปผลการ sync: จำนวนแถวที่เพิ่มใหม่ / อัปเดต / ไม่เปลี่ยนแปลง / หมดอายุ / ข้อมูลเสีย"""
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    expired: int = 0
+    rejected: int = 0
+
+    @property
+    def written(self):
+        """จำนวนแถวที่ถูกเขียนจริง (เพิ่มใหม่ + อัปเดต)"""
+        return self.inserted + self.updated
+
+    def __str__(self):
+        return (f"{self.inserted} inserted, {self.updated} updated, "
+                f"{self.unchanged} unchanged, {self.expired} expired, {self.rejected} rejected")
+
+
+SQL_VARIABLE_CHUNK = 500 # จำนวน ? สูงสุดต่อคำสั่ง (ต่ำกว่า SQLITE_MAX_VARIABLE_NUMBER ของ SQLite รุ่นเก่า)
+
+# INSERT ดีลใหม่ หรือ UPDATE ดีลเดิมเฉพาะเมื่อ lastChange ใหม่กว่าที่เก็บไว้ (หรือดีลเคยหมดอายุ)
+UPSERT_DEAL_SQL = f''' INSERT INTO deals({", ".join(DEAL_COLUMNS)})
+              VALUES({",".join("?" * len(DEAL_COLUMNS))})
+              ON CONFLICT(dealID) DO UPDATE SET
+                {", ".join(f"{c} = excluded.{c}" for c in DEAL_COLUMNS if c != "dealID")},
+                isExpired = 0,
+                expiredAt = NULL
+              WHERE excluded.lastChange IS NULL OR deals.lastChange IS NULL
+                 OR excluded.lastChange > deals.lastChange OR deals.isExpired = 1 '''
+
+
+def _fetch_stored_versions(cursor, deal_ids):
+    """คืนค่า dict dealID -> (lastChange, isExpired, salePrice, savings) ของดีลที่มีอยู่แล้วในฐานข้อมูล"""
+    stored = {}
+    for i in range(0, len(deal_ids), SQL_VARIABLE_CHUNK):
+        chunk = deal_ids[i:i + SQL_VARIABLE_CHUNK]
+        placeholders = ",".join("?" * len(chunk))
+        cursor.execute(f"SELECT dealID, lastChange, isExpired, salePrice, savings FROM deals "
+                       f"WHERE dealID IN ({placeholders})", chunk)
+        for deal_id, last_change, is_expired, sale_price, savings in cursor:
+            stored[deal_id] = (last_change, is_expired, sale_price, savings)
+    return stored
+
+
+def _write_deals_batch(cursor, batch, seen_table=None, price_moves=None):
+    """
+    เขียน DealBatch ลงตาราง deals (ไม่ commit เอง) คืนค่า (inserted, updated, unchanged)
+
+    เทียบ lastChange ที่ได้จาก API กับค่าที่เก็บไว้ แล้วเขียนเฉพาะดีลใหม่หรือดีลที่เปลี่ยนแปลง
+    ดีลที่ราคา (salePrice) เปลี่ยนจะถูกบันทึกลง deal_price_history ใน transaction เดียวกัน
+    price_moves: Optional list รับ (row, salePrice เดิม, savings เดิม) ของดีลที่ salePrice/savings เปลี่ยน
+                 (ใช้โดย alerts.AlertEngine หลัง commit)
+    """
+    inserted = updated = unchanged = 0
+    deal_ids = batch.column("dealID")
+    if seen_table:
+        cursor.executemany(f"INSERT OR IGNORE INTO temp.{seen_table}(dealID) VALUES (?)",
+                           ((deal_id,) for deal_id in deal_ids))
+
+    # แยกดีลใหม่ / ดีลที่เปลี่ยน / ดีลที่ไม่เปลี่ยน โดยเทียบกับ lastChange ที่เก็บไว้
+    with instrument.span("insert.lookup", deals=len(deal_ids)):
+        stored = _fetch_stored_versions(cursor, deal_ids)
+    selected = []
+    price_changes = []
+    for row, deal_id, new_last_change, new_price, new_savings in zip(
+            batch.rows, deal_ids, batch.column("lastChange"), batch.column("salePrice"), batch.column("savings")):
+        if deal_id not in stored:
+            inserted += 1
+            old_price = old_savings = None
+        else:
+            old_last_change, is_expired, old_price, old_savings = stored[deal_id]
+            if (new_last_change is None or old_last_change is None
+                    or new_last_change > old_last_change or is_expired):
+                updated += 1
+            else:
+                unchanged += 1
+                selected.append(False)
+                continue
+        stored[deal_id] = (new_last_change, 0, new_price, new_savings) # กันดีลซ้ำใน batch เดียวกัน
+        selected.append(True)
+        if new_price is not None and new_price != old_price:
+            price_changes.append((deal_id, new_last_change, new_price))
+        if price_moves is not None and (new_price != old_price or new_savings != old_savings):
+            price_moves.append((row, old_price, old_savings))
+
+    if inserted or updated:
+        # ส่งเฉพาะแถวที่เปลี่ยนให้ executemany เป็น generator (ไม่สร้าง list ของแถวซ้ำ)
+        with instrument.span("insert.executemany", rows=inserted + updated):
+            cursor.executemany(UPSERT_DEAL_SQL, batch.select(selected))
+    if price_changes:
+        with instrument.span("insert.price_history", rows=len(price_changes)):
+            price_history.record_price_changes(cursor, price_changes)
+    if inserted or updated:
+        report_cache.bump_data_version(cursor)
+    return inserted, updated, unchanged
+
+
+def _count_written(inserted, updated, unchanged):
+    """เพิ่ม counter ของจำนวนแถวที่เขียน (instrument)"""
+    instrument.count("rows.inserted", inserted)
+    instrument.count("rows.updated", updated)
+    instrument.count("rows.unchanged", unchanged)
+
+
+def _evaluate_alerts(alert_engine, price_moves):
+    """ส่งดีลที่ราคาเปลี่ยนให้ AlertEngine พร้อมจับเวลา"""
+    with instrument.span("alerts", deals=len(price_moves)) as alerts_span:
+        emitted = alert_engine.evaluate(price_moves)
+        alerts_span.set(alerts=emitted)
+    instrument.count("alerts.emitted", emitted)
+
+
+def _forward_rejects(batch_rejects, rejects):
+    """ส่ง (deal, เหตุผล) ของดีลที่ข้อมูลเสียต่อให้ reject sink หรือ print สรุป 1 บรรทัดถ้าไม่มี sink"""
+    if rejects is not None:
+        for reject in batch_rejects:
+            rejects.append(reject)
+    elif batch_rejects:
+        print(f"Skipped {len(batch_rejects)} malformed deals (first: {batch_rejects[0][1]}).")
+
+
+def insert_deals_data(conn, deals_list, stats=None, seen_table=None, rejects=None, alert_engine=None):
+    """
+    เพิ่มหรืออัปเดตข้อมูลดีลเกมในตาราง deals แบบ incremental (1 หน้า = 1 transaction)
+
+    stats: Optional SyncStats สำหรับสะสมผลรวมข้ามหลายหน้า
+    seen_table: Optional ชื่อ temp table ที่ใช้บันทึก dealID ที่พบ (ใช้โดย sync_deals)
+    rejects: Optional reject sink (มี .append) รับ (deal, เหตุผล) ของดีลที่ข้อมูลเสีย
+             ถ้าไม่กำหนดจะ print สรุปจำนวนดีลที่ถูกข้ามเพียงบรรทัดเดียว
+    alert_engine: Optional alerts.AlertEngine ตรวจ watchlist กับดีลที่ราคา/ส่วนลดเปลี่ยนในหน้านี้หลัง commit
+    คืนค่าจำนวนแถวที่ถูกเขียน (เพิ่มใหม่ + อัปเดต)
+    """
     if not conn or not deals_list:
         print("Cannot insert data: No connection or no deals data.")
         return 0
 
     cursor = conn.cursor()
-    inserted_count = 0
-
-    # คำสั่ง SQL สำหรับเพิ่มข้อมูล
-    # ใช้ INSERT OR IGNORE เพื่อข้ามถ้า dealID ซ้ำ (ป้องกันการเพิ่มดีลเดิมซ้ำๆ)
-    sql = ''' INSERT OR IGNORE INTO deals(
-                internalName, title, metacriticLink, dealID, storeID, gameID,
-                salePrice, normalPrice, isOnSale, savings, metacriticScore,
-                steamRatingText, steamRatingPercent, steamRatingCount, steamAppID,
-                releaseDate, lastChange, dealRating, thumb
-              )
-              VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?) '''
-
-    deals_to_insert = []
-    for deal in deals_list:
-        # ดึงข้อมูลจาก JSON object แต่ละดีล
-        # ใช้ .get() เพื่อป้องกัน KeyError ถ้า key ไม่มีในบาง object
-        # แปลงประเภทข้อมูลให้ตรงกับที่กำหนดใน CREATE TABLE
-        try:
-            internalName = deal.get('internalName')
-            title = deal.get('title')
-            metacriticLink = deal.get('metacriticLink')
-            dealID = deal.get('dealID')
-            storeID = int(deal.get('storeID')) if deal.get('storeID') else None
-            gameID = int(deal.get('gameID')) if deal.get('gameID') else None
-            salePrice = float(deal.get('salePrice')) if deal.get('salePrice') else None
-            normalPrice = float(deal.get('normalPrice')) if deal.get('normalPrice') else None
-            isOnSale = int(deal.get('isOnSale')) if deal.get('isOnSale') else None
-            savings = float(deal.get('savings')) if deal.get('savings') else None
-            metacriticScore = int(deal.get('metacriticScore')) if deal.get('metacriticScore') else None
-            steamRatingText = deal.get('steamRatingText')
-            steamRatingPercent = int(deal.get('steamRatingPercent')) if deal.get('steamRatingPercent') else None
-            steamRatingCount = int(deal.get('steamRatingCount')) if deal.get('steamRatingCount') else None
-            steamAppID = int(deal.get('steamAppID')) if deal.get('steamAppID') else None
-            releaseDate = int(deal.get('releaseDate')) if deal.get('releaseDate') else None # เก็บเป็น timestamp
-            lastChange = int(deal.get('lastChange')) if deal.get('lastChange') else None # เก็บเป็น timestamp
-            dealRating = float(deal.get('dealRating')) if deal.get('dealRating') else None
-            thumb = deal.get('thumb')
-
-            # ตรวจสอบข้อมูลที่จำเป็น (เช่น ต้องมี dealID และ title)
-            if dealID and title:
-                 deals_to_insert.append((
-                     internalName, title, metacriticLink, dealID, storeID, gameID,
-                     salePrice, normalPrice, isOnSale, savings, metacriticScore,
-                     steamRatingText, steamRatingPercent, steamRatingCount, steamAppID,
-                     releaseDate, lastChange, dealRating, thumb
-                 ))
-            else:
-                 print(f"Skipping deal due to missing dealID or title: {deal}")
 
-        except (ValueError, TypeError) as e:
-             print(f"Error processing deal data: {deal}. Error: {e}")
-             continue # ข้าม deal นี้ ถ้ามีปัญหาในการแปลงประเภทข้อมูล
+    # แปลง JSON ทั้งหน้าเป็นแถวที่มีชนิดข้อมูลตรงกับตาราง (ดู normalize.DEAL_FIELDS)
+    page_rejects = []
+    with instrument.span("parse", deals=len(deals_list)):
+        batch = normalize_deals(deals_list, rejects=page_rejects)
+    instrument.count("deals.parsed", len(batch))
+    instrument.count("deals.rejected", len(page_rejects))
+    _forward_rejects(page_rejects, rejects)
 
+    if stats is None:
+        stats = SyncStats()
+    stats.rejected += len(page_rejects)
 
+    price_moves = [] if alert_engine is not None else None
     try:
-        cursor.executemany(sql, deals_to_insert)
-        conn.commit()
-        inserted_count = cursor.rowcount # จำนวนแถวที่ถูกเพิ่มจริงๆ (ไม่รวมที่ถูก IGNORE)
-        print(f"Successfully inserted {inserted_count} new deal records.")
-        return inserted_count
+        with instrument.span("insert", deals=len(batch)) as insert_span:
+            inserted, updated, unchanged = _write_deals_batch(cursor, batch, seen_table, price_moves)
+            conn.commit()
+            insert_span.set(inserted=inserted, updated=updated, unchanged=unchanged)
     except sqlite3.Error as e:
         print(f"Failed to insert deals data: {e}")
         conn.rollback()
         return 0
+    _count_written(inserted, updated, unchanged)
+    if price_moves:
+        _evaluate_alerts(alert_engine, price_moves)
+
+    stats.inserted += inserted
+    stats.updated += updated
+    stats.unchanged += unchanged
+    print(f"Successfully inserted {inserted} new and updated {updated} changed deal records ({unchanged} unchanged).")
+    return inserted + updated
+
+
+def expire_missing_deals(conn, seen_table, store_ids=None):
+    """ทำเครื่องหมายดีลที่ไม่อยู่ใน seen_table ว่าหมดอายุ (จำกัดเฉพาะ store_ids ถ้ากำหนด) คืนค่าจำนวนแถว"""
+    if store_ids is not None and not store_ids:
+        return 0
+    sql = f"""
+        UPDATE deals SET isExpired = 1, expiredAt = ?
+        WHERE isExpired = 0
+          AND dealID NOT IN (SELECT dealID FROM temp.{seen_table})
+    """
+    params = [int(time.time())]
+    if store_ids is not None:
+        sql += f" AND storeID IN ({','.join('?' * len(store_ids))})"
+        params.extend(store_ids)
+    try:
+        with instrument.span("expire"):
+            cursor = conn.execute(sql, params)
+        expired = cursor.rowcount
+        instrument.count("rows.expired", expired)
+        if expired:
+            report_cache.bump_data_version(cursor)
+        conn.commit()
+        return expired
+    except sqlite3.Error as e:
+        print(f"Failed to mark missing deals as expired: {e}")
+        conn.rollback()
+        return 0
+
+
+def sync_deals(conn, pages, full_crawl=False, store_ids=None, can_expire=None, alert_engine=None, rejects=None):
+    """
+    sync ดีลหลายหน้า (iterable ของ list ดีล) ลงฐานข้อมูลแบบ incremental
+
+    ถ้า full_crawl=True ดีลที่ไม่พบในรอบนี้จะถูกทำเครื่องหมายว่าหมดอายุ
+    can_expire: Optional callable ที่เรียกหลังจบทุกหน้า ถ้าคืนค่า False จะไม่ expire (เช่น มีหน้าที่ดึงไม่สำเร็จ)
+    alert_engine: Optional alerts.AlertEngine (ดู insert_deals_data)
+    rejects: Optional reject sink ของทุกหน้า (ดู insert_deals_data)
+    คืนค่า SyncStats
+    """
+    stats = SyncStats()
+    seen_table = "sync_seen" if full_crawl else None
+    if seen_table:
+        conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS {seen_table} (dealID TEXT PRIMARY KEY) WITHOUT ROWID")
+        conn.execute(f"DELETE FROM temp.{seen_table}")
+    try:
+        for page in pages:
+            insert_deals_data(conn, page, stats=stats, seen_table=seen_table, rejects=rejects,
+                              alert_engine=alert_engine)
+        if seen_table and (can_expire is None or can_expire()):
+            stats.expired = expire_missing_deals(conn, seen_table, store_ids)
+    finally:
+        if seen_table:
+            conn.execute(f"DROP TABLE IF EXISTS temp.{seen_table}")
+    return stats
+
+# --- ฟังก์ชันสำหรับนำเข้าข้อมูลจำนวนมาก (bulk load) ---
+BULK_CHUNK_SIZE = 5000 # จำนวนดีลต่อ 1 transaction
+BULK_PROGRESS_EVERY = 20 # แสดงความคืบหน้าทุกๆ กี่ chunk
+
+
+def _drop_deals_indexes_and_triggers(conn):
+    """ลบ index รองและ trigger ของตาราง deals ชั่วคราว คืนค่า list ของ SQL สำหรับสร้างกลับ"""
+    definitions = conn.execute("""
+        SELECT type, name, sql FROM sqlite_master
+        WHERE tbl_name = 'deals' AND type IN ('index', 'trigger') AND sql IS NOT NULL
+    """).fetchall()
+    for object_type, name, _ in definitions:
+        conn.execute(f"DROP {object_type.upper()} IF EXISTS {name}")
+    conn.commit()
+    return [sql for _, _, sql in definitions]
+
+
+def _restore_deals_indexes_and_triggers(conn, definitions):
+    """สร้าง index/trigger กลับ แล้วคำนวณข้อมูลที่ trigger ดูแล (ตารางสรุปรายงาน) ใหม่"""
+    conn.execute("BEGIN")
+    for sql in definitions:
+        conn.execute(sql)
+    analytics.rebuild_report_summary(conn)
+    search.rebuild_search_index(conn)
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.commit()
+
+
+def bulk_load_deals(conn, deals, chunk_size=BULK_CHUNK_SIZE, cold=False, progress_every=BULK_PROGRESS_EVERY,
+                    alert_engine=None, rejects=None):
+    """
+    นำเข้าดีลจาก iterable ใดๆ (เช่น crawl ทีละหน้าแบบ stream หรือไฟล์ JSONL) ทีละ chunk
+
+    แต่ละ chunk ถูกเขียนใน transaction ของตัวเอง ถ้า chunk ใดล้มเหลวจะ rollback เฉพาะ chunk นั้น
+    หน่วยความจำที่ใช้ขึ้นกับ chunk_size เท่านั้น ไม่ขึ้นกับจำนวนดีลทั้งหมด
+    cold=True สำหรับโหลดครั้งแรกเข้าฐานข้อมูลว่าง: ปิด journal/fsync (journal_mode=OFF, synchronous=OFF)
+    และลบ index รอง/trigger ระหว่างโหลดแล้วสร้างใหม่ทีเดียวตอนจบ (ถ้าโปรแกรมล่มระหว่างนี้ไฟล์อาจเสีย
+    และ rollback ของ chunk ที่ล้มเหลวจะไม่สมบูรณ์)
+    alert_engine: Optional alerts.AlertEngine (ดู insert_deals_data) ตรวจทีละ chunk หลัง commit
+    rejects: Optional reject sink (ดู insert_deals_data) รับดีลที่ข้อมูลเสียของทุก chunk
+    คืนค่า SyncStats
+    """
+    stats = SyncStats()
+    deals = iter(deals)
+    cursor = conn.cursor()
+    failed_chunks = 0
+    loaded = 0
+    definitions = []
+    start = time.perf_counter()
+
+    if cold:
+        definitions = _drop_deals_indexes_and_triggers(conn)
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+    try:
+        chunk_number = 0
+        while True:
+            chunk = list(islice(deals, chunk_size))
+            if not chunk:
+                break
+            chunk_number += 1
+            chunk_rejects = []
+            with instrument.span("parse", deals=len(chunk)):
+                batch = normalize_deals(chunk, rejects=chunk_rejects)
+            instrument.count("deals.parsed", len(batch))
+            instrument.count("deals.rejected", len(chunk_rejects))
+            _forward_rejects(chunk_rejects, rejects)
+            stats.rejected += len(chunk_rejects)
+            price_moves = [] if alert_engine is not None else None
+            try:
+                with instrument.span("insert", deals=len(batch), chunk=chunk_number) as insert_span:
+                    conn.execute("BEGIN")
+                    inserted, updated, unchanged = _write_deals_batch(cursor, batch, price_moves=price_moves)
+                    conn.commit()
+                    insert_span.set(inserted=inserted, updated=updated, unchanged=unchanged)
+            except sqlite3.Error as e:
+                conn.rollback()
+                failed_chunks += 1
+                print(f"Chunk {chunk_number} failed and was rolled back: {e}")
+                continue
+            _count_written(inserted, updated, unchanged)
+            if price_moves:
+                _evaluate_alerts(alert_engine, price_moves)
+            stats.inserted += inserted
+            stats.updated += updated
+            stats.unchanged += unchanged
+            loaded += len(chunk)
+            if progress_every and chunk_number % progress_every == 0:
+                elapsed = time.perf_counter() - start
+                print(f"  {loaded:,} deals processed ({loaded / elapsed:,.0f} rows/s)")
+    finally:
+        if cold:
+            configure_connection(conn)
+            with instrument.span("bulk.restore_indexes", objects=len(definitions)):
+                _restore_deals_indexes_and_triggers(conn, definitions)
+
+    elapsed = time.perf_counter() - start
+    rate = loaded / elapsed if elapsed > 0 else 0
+    print(f"Bulk load complete: {loaded:,} deals in {elapsed:.1f}s ({rate:,.0f} rows/s); {stats}"
+          + (f"; {failed_chunks} chunks failed" if failed_chunks else ""))
+    return stats
+
 
 # --- Helper function สำหรับแสดงผลเป็นตาราง ---
-def print_table(headers, data, col_widths=None):
+PRINT_SAMPLE_ROWS = 1000 # จำนวนแถวแรกที่ใช้คำนวณความกว้างคอลัมน์
+PRINT_BATCH_ROWS = 500 # จำนวนแถวที่รวมเป็น 1 ครั้งของการ write
+
+
+def _format_cell(item):
+    """แปลงค่าในตารางเป็น string (None แสดงเป็น NULL)"""
+    return str(item) if item is not None else "NULL"
+
+
+def _format_decimal(value):
+    """แปลงตัวเลขเป็นทศนิยม 2 ตำแหน่ง (None แสดงเป็น NULL เหมือน _format_cell)"""
+    return f"{value:.2f}" if value is not None else "NULL"
+
+
+def print_table(headers, data, col_widths=None, limit=None, offset=0,
+                sample_size=PRINT_SAMPLE_ROWS, out=None):
     """
     แสดงข้อมูลในรูปแบบตาราง
 
     headers: List ของชื่อคอลัมน์ (strings)
-    data: List ของ Tuple หรือ List ของ List (แต่ละ Tuple/List คือ 1 แถวข้อมูล)
-    col_widths: Optional List ของความกว้างที่ต้องการสำหรับแต่ละคอลัมน์
+    data: iterable ของแถว (List ของ Tuple, sqlite3 cursor หรือ generator) อ่านทีละแถวแบบ stream
+    col_widths: Optional List ของความกว้างที่ต้องการสำหรับแต่ละคอลัมน์ (ใส่ None ในคอลัมน์ที่ให้คำนวณเอง)
+    limit, offset: แสดงเฉพาะ limit แถว หลังข้าม offset แถวแรก (ใช้แบ่งหน้าผลลัพธ์ขนาดใหญ่)
+    sample_size: ความกว้างที่คำนวณเองจะดูจากข้อมูลไม่เกิน sample_size แถวแรก (ค่าที่ยาวกว่าจะถูกตัด)
+    out: Optional file object สำหรับเขียนผลลัพธ์ (ค่าเริ่มต้น sys.stdout) เขียนเป็นชุดละ PRINT_BATCH_ROWS แถว
+    คืนค่าจำนวนแถวที่แสดง
     """
+    out = out if out is not None else sys.stdout
     if not headers:
-        print("No headers provided.")
-        return
-    if not data:
-        print("No data to display.")
-        return
-
-    # คำนวณความกว้างของแต่ละคอลัมน์ ถ้าไม่ได้กำหนดมา
-    if col_widths is None:
-        col_widths = [len(h) for h in headers]
-        for row in data:
+        out.write("No headers provided.\n")
+        return 0
+
+    rows = islice(data, offset, None) if offset else iter(data)
+    # อ่านแถวเกิน limit 1 แถวเพื่อรู้ว่ายังมีหน้าถัดไปหรือไม่
+    if limit is not None:
+        rows = islice(rows, limit + 1)
+    sample = list(islice(rows, min(sample_size, limit + 1) if limit is not None else sample_size))
+    if not sample:
+        out.write("No data to display.\n")
+        return 0
+
+    # คำนวณความกว้างของแต่ละคอลัมน์ที่ไม่ได้กำหนดมา จากแถวตัวอย่าง
+    if col_widths is None or None in col_widths:
+        given = list(col_widths) if col_widths is not None else []
+        widths = [len(h) for h in headers]
+        for row in sample:
+            if len(row) > len(widths): # กรณีมีคอลัมน์ในข้อมูลมากกว่าใน headers (ไม่ควรเกิดขึ้นถ้า query ถูกต้อง)
+                widths.extend([0] * (len(row) - len(widths)))
             for i, item in enumerate(row):
-                # แปลงข้อมูลเป็น string ก่อนวัดความยาว
-                item_str = str(item) if item is not None else "NULL"
-                if i < len(col_widths): # ตรวจสอบขอบเขต
-                    col_widths[i] = max(col_widths[i], len(item_str))
-                else: # กรณีมีคอลัมน์ในข้อมูลมากกว่าใน headers (ไม่ควรเกิดขึ้นถ้า query ถูกต้อง)
-                    col_widths.append(len(item_str))
+                widths[i] = max(widths[i], len(_format_cell(item)))
+        col_widths = [given[i] if i < len(given) and given[i] is not None else w for i, w in enumerate(widths)]
 
     # ปรับความกว้างขั้นต่ำ (เผื่อกรณีข้อมูลสั้นมาก)
     min_width = 5
     col_widths = [max(w, min_width) for w in col_widths]
 
-    # สร้างรูปแบบสำหรับแต่ละแถว
-    format_string = " | ".join([f"{{:<{w}}}" for w in col_widths]) # {:<w} คือ จัดชิดซ้าย กว้าง w
+    # สร้างรูปแบบสำหรับแต่ละแถว: {:<w.w} คือ จัดชิดซ้าย กว้าง w และตัดข้อความที่ยาวเกิน w (ป้องกันตารางเบี้ยว)
+    row_format = " | ".join([f"{{:<{w}.{w}}}" for w in col_widths]).format
+    header_format = " | ".join([f"{{:<{w}}}" for w in col_widths]).format
+    separator = "-" * (sum(col_widths) + (len(col_widths) - 1) * 3 + 2)
 
     # แสดง Header
-    print("-" * (sum(col_widths) + (len(col_widths) - 1) * 3 + 2)) # เส้นคั่นด้านบน
-    print(format_string.format(*headers))
-    print("-" * (sum(col_widths) + (len(col_widths) - 1) * 3 + 2)) # เส้นคั่นระหว่าง Header กับ Data
+    out.write(f"{separator}\n{header_format(*headers)}\n{separator}\n")
 
-    # แสดง Data
-    for row in data:
-        # แปลงข้อมูลในแถวเป็น string และจัดการค่า None
-        formatted_row = [str(item) if item is not None else "NULL" for item in row]
-        # ตัดข้อความที่ยาวเกินความกว้างคอลัมน์ (ป้องกันตารางเบี้ยว)
-        truncated_row = [item[:col_widths[i]] if i < len(col_widths) else item for i, item in enumerate(formatted_row)]
-        print(format_string.format(*truncated_row))
+    # แสดง Data: รวมหลายแถวแล้ว write ครั้งเดียว แทนการ print ทีละแถว
+    shown = 0
+    has_more = False
+    lines = []
+    for row in chain(sample, rows):
+        if limit is not None and shown >= limit:
+            has_more = True
+            break
+        lines.append(row_format(*map(_format_cell, row)))
+        shown += 1
+        if len(lines) >= PRINT_BATCH_ROWS:
+            lines.append("")
+            out.write("\n".join(lines))
+            lines = []
+    lines.append(separator) # เส้นคั่นด้านล่าง
+    if has_more:
+        lines.append(f"... more rows not shown (next page: offset {offset + shown})")
+    out.write("\n".join(lines) + "\n\n\n") # บรรทัดว่างหลังตาราง
+    return shown
 
-    print("-" * (sum(col_widths) + (len(col_widths) - 1) * 3 + 2)) # เส้นคั่นด้านล่าง
-    print("\n") # บรรทัดว่างหลังตาราง
+
+# บรรทัดของ plan ที่อ่านตาราง deals (หรือ alias d): SCAN/SEARCH, index ที่ใช้ และเงื่อนไขในวงเล็บ
+_PLAN_READ = re.compile(r"^(SCAN|SEARCH) (?:deals|d)(?: USING (?:COVERING )?INDEX \S+(?: \((.*)\))?)?$")
+
+
+def _plan_issues(sql, plan, stops_early=False):
+    """
+    ปัญหาใน query plan (plan = แถวของ EXPLAIN QUERY PLAN: id, parent, notused, detail)
+    - FULL SCAN: SCAN ตาราง deals โดยไม่ใช้ index
+    - FULL INDEX SCAN: อ่าน index ทั้งก้อน ได้แก่ SCAN deals USING ... INDEX และ SEARCH ที่มีแค่เงื่อนไข
+      (col>?) ซึ่ง SQLite สร้างจาก col IS NOT NULL ของ partial index (ไม่ใช่ช่วงที่แคบลงจริง)
+      ยกเว้นการอ่านระดับบนสุดของ query ที่มี LIMIT (หรือ stops_early = ผู้เรียกหยุดอ่านเอง) และไม่ต้อง sort เอง
+      ซึ่งเดิน index ตามลำดับของ ORDER BY แล้วหยุดเมื่อครบ ส่วน subquery ที่อ่านแบบนี้นับเป็นการอ่านทั้ง index
+    - TEMP B-TREE: ต้อง sort/group ผลลัพธ์ใน temp B-tree (USE TEMP B-TREE FOR ORDER BY/GROUP BY/DISTINCT)
+    """
+    issues = []
+    has_temp_sort = any(row[3].startswith("USE TEMP B-TREE") for row in plan)
+    ordered_limit = (stops_early or "LIMIT" in sql.upper()) and not any(
+        row[1] == 0 and row[3].startswith("USE TEMP B-TREE") for row in plan)
+    full_scan = full_index_scan = False
+    for _, parent, _, detail in plan:
+        match = _PLAN_READ.match(detail)
+        if not match:
+            continue
+        if "INDEX" not in detail:
+            full_scan = True
+            continue
+        kind, constraint = match.groups()
+        if kind == "SEARCH":
+            lower_bound = re.fullmatch(r"(\w+)>\?", constraint or "")
+            if not lower_bound:
+                continue # ค้นด้วย = หรือช่วงที่มีทั้งขอบบน/ขอบล่าง
+            column = lower_bound.group(1)
+            if parent == 0 and re.search(rf"\b{column}\s*(?:>|<|=|BETWEEN)", sql, re.IGNORECASE):
+                continue # มีเงื่อนไขช่วงของคอลัมน์นี้จริงใน query
+        if parent != 0 or not ordered_limit:
+            full_index_scan = True
+    if full_scan:
+        issues.append("FULL SCAN")
+    if full_index_scan:
+        issues.append("FULL INDEX SCAN")
+    if has_temp_sort:
+        issues.append("TEMP B-TREE")
+    return issues
+
+
+def explain_report_queries(conn):
+    """
+    แสดง EXPLAIN QUERY PLAN ของทุก query ใน REPORT_QUERIES (engine 'sql') และ SUMMARY_QUERIES
+    (query เฉพาะของ engine 'summary' แสดงเป็น summary:<ชื่อ>)
+
+    query ที่ scan ตาราง deals ทั้งตาราง (FULL SCAN), อ่าน index ทั้งก้อน (FULL INDEX SCAN)
+    หรือต้อง sort ใน temp B-tree (TEMP B-TREE) จะถูกทำเครื่องหมายไว้ (ดู _plan_issues)
+    คืนค่า dict ชื่อ query -> list ของปัญหา (เฉพาะ query ที่มีปัญหา)
+    """
+    queries = [(name, sql, REPORT_SAMPLE_PARAMS.get(name, ()), False) for name, sql in REPORT_QUERIES.items()]
+    queries += [(f"summary:{name}", sql, analytics.SUMMARY_SAMPLE_PARAMS.get(name, ()),
+                 name in analytics.STREAMED_QUERIES) for name, sql in analytics.SUMMARY_QUERIES.items()]
+    flagged = {}
+    for name, sql, params, stops_early in queries:
+        try:
+            plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        except sqlite3.Error as e:
+            print(f"{name}: cannot explain query: {e}")
+            continue
+        issues = _plan_issues(sql, plan, stops_early)
+        if issues:
+            flagged[name] = issues
+        print(f"{name}{'  <-- ' + ', '.join(issues) if issues else ''}")
+        for row in plan:
+            print(f"    {row[3]}")
+    print()
+    for issue, description in (("FULL SCAN", "do a full table scan"), ("FULL INDEX SCAN", "read a whole index"),
+                               ("TEMP B-TREE", "sort or group in a temp B-tree")):
+        count = sum(issue in issues for issues in flagged.values())
+        print(f"{count} of {len(queries)} report queries {description}.")
+    return flagged
 
 
 # --- ฟังก์ชันสำหรับทำ Data Analytics ด้วย SQL (ปรับปรุงการแสดงผล) ---
-def analyze_deals_data(conn):
-    """วิเคราะห์ข้อมูลดีลเกมในฐานข้อมูลด้วย SQL และแสดงผลเป็นตาราง"""
+ANALYTICS_ENGINES = {
+    "summary": analytics.compute_deals_report, # ตารางสรุป + top-k ผ่าน index (ค่าเริ่มต้น)
+    "sql": analytics.run_report_queries, # รัน SQL ของรายงานทีละข้อ
+}
+
+
+def print_deals_report(report):
+    """แสดง DealsReport เป็นตารางตามลำดับรายงาน 1-11"""
+    # 1: นับจำนวนดีลทั้งหมด
+    print("1. Total number of deals stored:")
+    print_table(["Total Deals"], [(report.total_deals,)]) # ใส่ผลลัพธ์ใน List ของ List/Tuple
+
+    # 2: แสดงดีล 5 อันดับแรกที่มีส่วนลด (savings) สูงสุด
+    print("2. Top 5 deals with highest savings:")
+    # กำหนดความกว้างคอลัมน์เองเพื่อให้ title ไม่ยาวเกินไป
+    print_table(["Title", "Savings (%)", "Sale Price ($)", "Normal Price ($)"], report.top_savings, col_widths=[40, 12, 15, 15])
+
+
+    # 3: แสดงดีล 5 อันดับแรกที่มีคะแนน Metacritic สูงสุด
+    print("3. Top 5 deals with highest Metacritic Score:")
+    print_table(["Title", "Metacritic Score", "Sale Price ($)"], report.top_metacritic, col_widths=[40, 18, 15])
+
+
+    # 4: แสดงดีล 5 อันดับแรกที่มี Steam Rating Percent สูงสุด (และมีจำนวนรีวิวมากพอสมควร)
+    print("4. Top 5 deals with highest Steam Rating Percent (min 1000 reviews):")
+    print_table(["Title", "Steam Rating Text", "Steam Rating (%)", "Steam Reviews", "Sale Price ($)"], report.top_steam_rating, col_widths=[40, 20, 18, 15, 15])
+
+
+    # 5: แสดงค่าเฉลี่ย Steam Rating Percent ของดีลทั้งหมด
+    print("5. Average Steam Rating Percent of all deals:")
+    if report.avg_steam_rating is not None:
+         print_table(["Average Steam Rating (%)"], [[f"{report.avg_steam_rating:.2f}"]]) # จัดรูปแบบทศนิยมและใส่ใน List ของ List
+    else:
+         print("   No Steam Rating Percent data available for average calculation.")
+
+
+    # 6: แสดงจำนวนดีลแยกตาม Steam Rating Text
+    print("6. Number of deals by Steam Rating Text:")
+    print_table(["Steam Rating Text", "Number of Deals"], report.rating_text_counts)
+
+
+    # 7: แสดงดีลที่มี Metacritic Score สูงกว่าค่าเฉลี่ย Metacritic Score ทั้งหมด
+    print("7. Deals with Metacritic Score above average:")
+    print_table(["Title", "Metacritic Score", "Sale Price ($)"], report.above_avg_metacritic, col_widths=[40, 18, 15])
+
+
+    # 8: แสดงดีลที่มี Steam Rating Percent สูงกว่าค่าเฉลี่ย Steam Rating Percent ของดีลที่มี Steam Rating Text เดียวกัน
+    print("8. Deals with Steam Rating Percent above average for their rating text category:")
+    # ปรับการแสดงผล avg_percent ให้มีทศนิยม
+    formatted_data = [(row[0], row[1], row[2], f"{row[3]:.2f}") for row in report.above_avg_steam_rating]
+    print_table(["Title", "Steam Rating Text", "Steam Rating (%)", "Avg for Category (%)"], formatted_data, col_widths=[40, 20, 18, 20])
+
+
+    # 9: แสดงดีลที่มี Metacritic Score สูง (>= 85) และมี Steam Rating Percent สูง (>= 90) และมีส่วนลด (savings) มากกว่า 70%
+    print("9. High-rated deals with significant savings:")
+    # ปรับการแสดงผล savings และ salePrice ให้มีทศนิยม
+    formatted_data = [(row[0], row[1], row[2], f"{row[3]:.2f}", f"{row[4]:.2f}") for row in report.high_rated_savings]
+    print_table(["Title", "Meta Score", "Steam (%)", "Savings (%)", "Sale Price ($)"], formatted_data, col_widths=[40, 12, 12, 12, 15])
+
+
+    # 10: แสดงดีลที่มีจำนวนรีวิว Steam (steamRatingCount) อยู่ในช่วง Top 10%
+    print("10. Deals with Steam Rating Count in the top 10%:")
+    if report.top10_review_cutoff is not None:
+        print(f"   Minimum review count for top 10%: {report.top10_review_cutoff}")
+        # ปรับการแสดงผล percent และ price
+        formatted_data = [(row[0], row[1], row[2], f"{row[3]:.2f}", f"{row[4]:.2f}") for row in report.top10_review_count]
+        print_table(["Title", "Reviews", "Steam Rating Text", "Steam Rating (%)", "Sale Price ($)"], formatted_data, col_widths=[40, 10, 20, 18, 15])
+    else:
+        print("   Not enough data to calculate top 10% review count.")
+
+
+    # 11: แสดงดีลที่ออกก่อนปี 2015 และยังมีดีลอยู่
+    print("11. Deals released before 2015:")
+    if report.released_before:
+        # แปลง timestamp เป็นวันที่ใน Python ก่อนแสดงผล
+        formatted_data = []
+        for title, release_ts, price in report.released_before:
+             release_date_str = datetime.datetime.fromtimestamp(release_ts).strftime('%d-%m-%Y')
+             formatted_data.append((title, release_date_str, f"{price:.2f}"))
+        print_table(["Title", "Release Date", "Sale Price ($)"], formatted_data, col_widths=[40, 15, 15])
+    else:
+        print("   No deals found released before 2015.")
+
+
+def print_search_results(conn, query, limit=search.SEARCH_LIMIT):
+    """ค้นหาดีลจากชื่อเกม (รองรับ substring และการพิมพ์ผิด) แล้วแสดงเป็นตาราง"""
+    print(f"Search results for '{query}':")
+    try:
+        results = search.search_deals(conn, query, limit=limit)
+    except sqlite3.Error as e:
+        print(f"Error searching deals: {e}")
+        return []
+    print_table(["Title", "Sale Price ($)", "Savings (%)", "Deal Rating", "Deal ID"],
+                [(title, _format_decimal(price), _format_decimal(savings), rating, deal_id)
+                 for deal_id, title, price, savings, rating, _ in results],
+                col_widths=[40, 15, 12, 12, None])
+    return results
+
+
+def print_watchlist(conn):
+    """แสดง watchlist ทั้งหมดเป็นตาราง"""
+    watches = alerts.load_watches(conn)
+    print(f"Watchlist ({len(watches)} games):")
+    print_table(["Watch ID", "Game ID", "Steam App ID", "Target Price ($)", "Min Savings (%)"],
+                [(w.id, w.gameID, w.steamAppID, w.targetPrice, w.minSavings) for w in watches])
+
+
+def print_alert(alert):
+    """แสดง Alert 1 รายการเป็น 1 บรรทัด (ใช้เป็น callback ของ alerts.CallbackSink)"""
+    previous = f" (was ${alert.previousPrice:.2f})" if alert.previousPrice is not None else ""
+    print(f"ALERT watch {alert.watchID}: {alert.title} ${_format_decimal(alert.salePrice)}{previous}, "
+          f"{alert.savings or 0:.0f}% off at store {alert.storeID} [deal {alert.dealID}]")
+
+
+def print_deals_under(conn, max_price, limit=None, offset=0):
+    """
+    แสดงดีลทั้งหมดที่ราคาต่ำกว่า max_price เรียงตามราคา
+
+    ส่ง cursor ให้ print_table โดยตรง (ไม่ใช้ fetchall) จึงใช้หน่วยความจำคงที่แม้ผลลัพธ์มีหลายแสนแถว
+    คืนค่าจำนวนแถวที่แสดง
+    """
+    print(f"Deals under ${max_price:.2f}:")
+    try:
+        cursor = conn.execute('''
+            SELECT title, storeID, salePrice, normalPrice, savings
+            FROM deals WHERE salePrice < ? ORDER BY salePrice
+        ''', (max_price,))
+        return print_table(["Title", "Store", "Sale Price ($)", "Normal Price ($)", "Savings (%)"], cursor,
+                           col_widths=[40, 5, 15, 16, None], limit=limit, offset=offset)
+    except sqlite3.Error as e:
+        print(f"Error listing deals: {e}")
+        return 0
+
+
+def analyze_deals_data(conn, engine="summary", cache=None):
+    """
+    วิเคราะห์ข้อมูลดีลเกมในฐานข้อมูล (engine: 'summary' หรือ 'sql') และแสดงผลเป็นตาราง คืนค่า DealsReport
+
+    cache: Optional report_cache.ReportCache ถ้าข้อมูลไม่เปลี่ยนตั้งแต่ครั้งก่อนจะใช้ผลเดิมโดยไม่ query ใหม่
+    """
     if not conn:
         print("Cannot analyze data: No connection.")
-        return
+        return None
 
-    cursor = conn.cursor()
     print("\n--- Data Analysis Results ---")
 
     try:
-        # 1: นับจำนวนดีลทั้งหมด
-        print("1. Total number of deals stored:")
-        cursor.execute("SELECT COUNT(*) FROM deals")
-        total_deals = cursor.fetchone() # fetchone() คืนค่าเป็น Tuple
-        print_table(["Total Deals"], [total_deals]) # ใส่ผลลัพธ์ใน List ของ List/Tuple
-
-        # 2: แสดงดีล 5 อันดับแรกที่มีส่วนลด (savings) สูงสุด
-        print("2. Top 5 deals with highest savings:")
-        cursor.execute("SELECT title, savings, salePrice, normalPrice FROM deals ORDER BY savings DESC LIMIT 5")
-        top_savings_deals = cursor.fetchall()
-        # กำหนดความกว้างคอลัมน์เองเพื่อให้ title ไม่ยาวเกินไป
-        print_table(["Title", "Savings (%)", "Sale Price ($)", "Normal Price ($)"], top_savings_deals, col_widths=[40, 12, 15, 15])
-
-
-        # 3: แสดงดีล 5 อันดับแรกที่มีคะแนน Metacritic สูงสุด
-        print("3. Top 5 deals with highest Metacritic Score:")
-        cursor.execute("SELECT title, metacriticScore, salePrice FROM deals WHERE metacriticScore IS NOT NULL ORDER BY metacriticScore DESC LIMIT 5")
-        top_metacritic_deals = cursor.fetchall()
-        print_table(["Title", "Metacritic Score", "Sale Price ($)"], top_metacritic_deals, col_widths=[40, 18, 15])
-
-
-        # 4: แสดงดีล 5 อันดับแรกที่มี Steam Rating Percent สูงสุด (และมีจำนวนรีวิวมากพอสมควร)
-        print("4. Top 5 deals with highest Steam Rating Percent (min 1000 reviews):")
-        cursor.execute("SELECT title, steamRatingText, steamRatingPercent, steamRatingCount, salePrice FROM deals WHERE steamRatingPercent IS NOT NULL AND steamRatingCount >= 1000 ORDER BY steamRatingPercent DESC, steamRatingCount DESC LIMIT 5")
-        top_steam_rating_deals = cursor.fetchall()
-        print_table(["Title", "Steam Rating Text", "Steam Rating (%)", "Steam Reviews", "Sale Price ($)"], top_steam_rating_deals, col_widths=[40, 20, 18, 15, 15])
-
-
-        # 5: แสดงค่าเฉลี่ย Steam Rating Percent ของดีลทั้งหมด
-        print("5. Average Steam Rating Percent of all deals:")
-        cursor.execute("SELECT AVG(steamRatingPercent) FROM deals WHERE steamRatingPercent IS NOT NULL")
-        avg_steam_rating = cursor.fetchone()
-        if avg_steam_rating and avg_steam_rating[0] is not None:
-             print_table(["Average Steam Rating (%)"], [[f"{avg_steam_rating[0]:.2f}"]]) # จัดรูปแบบทศนิยมและใส่ใน List ของ List
-        else:
-             print("   No Steam Rating Percent data available for average calculation.")
-
-
-        # 6: แสดงจำนวนดีลแยกตาม Steam Rating Text
-        print("6. Number of deals by Steam Rating Text:")
-        cursor.execute("SELECT steamRatingText, COUNT(*) FROM deals WHERE steamRatingText IS NOT NULL GROUP BY steamRatingText ORDER BY COUNT(*) DESC")
-        rating_counts = cursor.fetchall()
-        print_table(["Steam Rating Text", "Number of Deals"], rating_counts)
-        
-
-        # 7: แสดงดีลที่มี Metacritic Score สูงกว่าค่าเฉลี่ย Metacritic Score ทั้งหมด
-        print("7. Deals with Metacritic Score above average:")
-        cursor.execute("""
-            SELECT title, metacriticScore, salePrice
-            FROM deals
-            WHERE metacriticScore IS NOT NULL
-              AND metacriticScore > (SELECT AVG(metacriticScore) FROM deals WHERE metacriticScore IS NOT NULL)
-            ORDER BY metacriticScore DESC
-            LIMIT 10;
-        """)
-        above_average_metacritic = cursor.fetchall()
-        print_table(["Title", "Metacritic Score", "Sale Price ($)"], above_average_metacritic, col_widths=[40, 18, 15])
-
-
-        # 8: แสดงดีลที่มี Steam Rating Percent สูงกว่าค่าเฉลี่ย Steam Rating Percent ของดีลที่มี Steam Rating Text เดียวกัน
-        print("8. Deals with Steam Rating Percent above average for their rating text category:")
-        cursor.execute("""
-            WITH AvgRatings AS (
-                SELECT
-                    steamRatingText,
-                    AVG(steamRatingPercent) as avg_percent
-                FROM deals
-                WHERE steamRatingText IS NOT NULL
-                GROUP BY steamRatingText
-            )
-            SELECT
-                d.title,
-                d.steamRatingText,
-                d.steamRatingPercent,
-                ar.avg_percent
-            FROM deals d
-            JOIN AvgRatings ar ON d.steamRatingText = ar.steamRatingText
-            WHERE d.steamRatingPercent IS NOT NULL
-              AND d.steamRatingPercent > ar.avg_percent
-            ORDER BY d.steamRatingPercent DESC
-            LIMIT 10;
-        """)
-        above_average_steam_rating = cursor.fetchall()
-        # ปรับการแสดงผล avg_percent ให้มีทศนิยม
-        formatted_data = [(row[0], row[1], row[2], f"{row[3]:.2f}") for row in above_average_steam_rating]
-        print_table(["Title", "Steam Rating Text", "Steam Rating (%)", "Avg for Category (%)"], formatted_data, col_widths=[40, 20, 18, 20])
-
-
-        # 9: แสดงดีลที่มี Metacritic Score สูง (>= 85) และมี Steam Rating Percent สูง (>= 90) และมีส่วนลด (savings) มากกว่า 70%
-        print("9. High-rated deals with significant savings:")
-        cursor.execute("""
-            SELECT title, metacriticScore, steamRatingPercent, savings, salePrice
-            FROM deals
-            WHERE metacriticScore IS NOT NULL AND metacriticScore >= 85
-              AND steamRatingPercent IS NOT NULL AND steamRatingPercent >= 90
-              AND savings IS NOT NULL AND savings >= 70
-            ORDER BY savings DESC, metacriticScore DESC
-            LIMIT 10;
-        """)
-        high_rated_deals = cursor.fetchall()
-        # ปรับการแสดงผล savings และ salePrice ให้มีทศนิยม
-        formatted_data = [(row[0], row[1], row[2], f"{row[3]:.2f}", f"{row[4]:.2f}") for row in high_rated_deals]
-        print_table(["Title", "Meta Score", "Steam (%)", "Savings (%)", "Sale Price ($)"], formatted_data, col_widths=[40, 12, 12, 12, 15])
-
-
-        # 10: แสดงดีลที่มีจำนวนรีวิว Steam (steamRatingCount) อยู่ในช่วง Top 10%
-        print("10. Deals with Steam Rating Count in the top 10%:")
-        cursor.execute("""
-            SELECT MIN(steamRatingCount)
-            FROM (
-                SELECT steamRatingCount
-                FROM deals
-                WHERE steamRatingCount IS NOT NULL
-                ORDER BY steamRatingCount DESC
-                LIMIT (SELECT CAST(COUNT(*) * 0.1 AS INTEGER) FROM deals WHERE steamRatingCount IS NOT NULL)
-            ) AS Top10PercentCounts;
-        """)
-        min_count_for_top10 = cursor.fetchone()[0]
-
-        if min_count_for_top10 is not None:
-            print(f"   Minimum review count for top 10%: {min_count_for_top10}")
-            cursor.execute("""
-                SELECT title, steamRatingCount, steamRatingText, steamRatingPercent, salePrice
-                FROM deals
-                WHERE steamRatingCount IS NOT NULL
-                  AND steamRatingCount >= ?
-                ORDER BY steamRatingCount DESC
-                LIMIT 10;
-            """, (min_count_for_top10,))
-            top_review_count_deals = cursor.fetchall()
-            # ปรับการแสดงผล percent และ price
-            formatted_data = [(row[0], row[1], row[2], f"{row[3]:.2f}", f"{row[4]:.2f}") for row in top_review_count_deals]
-            print_table(["Title", "Reviews", "Steam Rating Text", "Steam Rating (%)", "Sale Price ($)"], formatted_data, col_widths=[40, 10, 20, 18, 15])
-        else:
-            print("   Not enough data to calculate top 10% review count.")
-
-
-        # 11: แสดงดีลที่ออกก่อนปี 2015 และยังมีดีลอยู่
-        timestamp_2015 = 1420070400
-        print("11. Deals released before 2015:")
-        cursor.execute("""
-            SELECT title, releaseDate, salePrice
-            FROM deals
-            WHERE releaseDate IS NOT NULL
-              AND releaseDate < ?
-            ORDER BY releaseDate ASC
-            LIMIT 10;
-        """, (timestamp_2015,))
-        old_deals = cursor.fetchall()
-        if old_deals:
-            # แปลง timestamp เป็นวันที่ใน Python ก่อนแสดงผล
-            formatted_data = []
-            for title, release_ts, price in old_deals:
-                 release_date_str = datetime.datetime.fromtimestamp(release_ts).strftime('%d-%m-%Y')
-                 formatted_data.append((title, release_date_str, f"{price:.2f}"))
-            print_table(["Title", "Release Date", "Sale Price ($)"], formatted_data, col_widths=[40, 15, 15])
-        else:
-            print("   No deals found released before 2015.")
-
-
+        with instrument.span("analyze", engine=engine) as analyze_span:
+            if cache is None:
+                report = ANALYTICS_ENGINES[engine](conn)
+            else:
+                start = time.perf_counter()
+                payload, hit = cache.get_or_compute(
+                    f"deals_report/{engine}", [TIMESTAMP_2015],
+                    lambda: analytics.report_to_payload(ANALYTICS_ENGINES[engine](conn)))
+                report = analytics.report_from_payload(payload)
+                if hit:
+                    report.cached = True
+                    report.elapsed = time.perf_counter() - start
+            analyze_span.set(cached=report.cached)
     except sqlite3.Error as e:
         print(f"Error during data analysis: {e}")
+        return None
+    with instrument.span("analyze.print"):
+        print_deals_report(report)
+    return report
 
 # --- ส่วน Main Execution ---
+def parse_args(argv=None):
+    """อ่าน argument จาก command line"""
+    parser = argparse.ArgumentParser(description="CheapShark deals pipeline: fetch, store and analyze game deals.")
+    parser.add_argument("--db", default=DATABASE_NAME, help="SQLite database file (default: %(default)s)")
+    parser.add_argument("--crawl", action="store_true",
+                        help="crawl every page of every store/price band instead of the single API_URL page")
+    parser.add_argument("--stores", help="comma-separated storeIDs to crawl (default: all active stores)")
+    parser.add_argument("--workers", type=int, default=CRAWL_MAX_WORKERS,
+                        help="max concurrent API requests while crawling (default: %(default)s)")
+    parser.add_argument("--replay", nargs="+", metavar="PATH",
+                        help="ingest recorded API responses (JSON array/JSONL, optionally .gz, or directories of them) "
+                             "instead of calling the API")
+    parser.add_argument("--record", metavar="FILE",
+                        help="also save every fetched page to FILE (JSONL, gzip if it ends in .gz) for --replay")
+    parser.add_argument("--bulk-load", nargs="+", metavar="PATH",
+                        help="load deals from recorded files (same formats as --replay) in chunks instead of calling the API")
+    parser.add_argument("--chunk-size", type=int, default=BULK_CHUNK_SIZE,
+                        help="deals per transaction for --bulk-load (default: %(default)s)")
+    parser.add_argument("--cold", action="store_true",
+                        help="with --bulk-load: disable journaling/fsync and rebuild indexes at the end (initial loads only)")
+    parser.add_argument("--engine", choices=sorted(ANALYTICS_ENGINES), default="summary",
+                        help="analytics engine for the report (default: %(default)s)")
+    parser.add_argument("--search", metavar="TEXT",
+                        help="search stored deals by title (substring, typo-tolerant) and exit")
+    parser.add_argument("--under", type=float, metavar="PRICE",
+                        help="list every stored deal cheaper than PRICE (streamed, sorted by price) and exit")
+    parser.add_argument("--limit", type=int, help="with --under/--search: show at most this many rows")
+    parser.add_argument("--offset", type=int, default=0, help="with --under: skip this many rows first")
+    parser.add_argument("--export", metavar="PATH",
+                        help="export the deals table to a columnar snapshot (Parquet or Arrow IPC file, or a directory of .npy files) "
+                             "and exit")
+    parser.add_argument("--export-format", choices=["auto", "parquet", "arrow", "npy"], default="auto",
+                        help="snapshot format for --export; auto uses Parquet when pyarrow is installed (default: %(default)s)")
+    parser.add_argument("--export-verify", action="store_true",
+                        help="after --export, read the snapshot back and compare every row with the deals table")
+    parser.add_argument("--watch", nargs=2, metavar=("GAME_ID", "PRICE"),
+                        help="add GAME_ID to the watchlist with a target sale price and exit")
+    parser.add_argument("--watch-steam", nargs=2, metavar=("APP_ID", "PRICE"),
+                        help="add a Steam App ID to the watchlist with a target sale price and exit")
+    parser.add_argument("--min-savings", type=float, metavar="PCT",
+                        help="with --watch/--watch-steam: also require at least PCT%% savings")
+    parser.add_argument("--unwatch", type=int, metavar="WATCH_ID", help="remove a watch from the watchlist and exit")
+    parser.add_argument("--watchlist", action="store_true", help="print the watchlist and exit")
+    parser.add_argument("--alerts", metavar="FILE",
+                        help="also append price-drop alerts raised while syncing to FILE (JSON lines)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always recompute the report instead of reusing a cached result for unchanged data")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="write timing spans and counters of every stage as JSON lines to FILE ('-' for stderr)")
+    parser.add_argument("--trace-sql", action="store_true",
+                        help="with --trace: also log every SQL statement SQLite runs (verbose)")
+    parser.add_argument("--trace-vm-steps", type=int, default=0, metavar="N",
+                        help="with --trace: count SQLite VM steps via a progress handler called every N steps")
+    parser.add_argument("--profile", metavar="FILE", help="run under cProfile and dump the stats to FILE")
+    parser.add_argument("--explain", action="store_true",
+                        help="print EXPLAIN QUERY PLAN for every report query and exit (no API call)")
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    # 1. Setup Database
-    connection = setup_database(DATABASE_NAME)
+    args = parse_args()
+    if args.trace or args.profile:
+        instrument.start(args.trace, profile_path=args.profile)
+        atexit.register(instrument.stop)
 
+    # 1. Setup Database
+    with instrument.span("setup", db=args.db):
+        connection = setup_database(args.db)
     if connection:
-        # 2. Fetch Data
-        deals_data = fetch_deals_from_api(API_URL)
+        instrument.attach_connection(connection, sql=args.trace_sql, progress_steps=args.trace_vm_steps)
 
-        if deals_data:
-            # 3. Insert Data
-            print("\nInserting data into database...")
-            inserted_count = insert_deals_data(connection, deals_data)
-            print(f"Data insertion complete. {inserted_count} new records inserted.")
+    if connection and args.explain:
+        explain_report_queries(connection)
+        connection.close()
+    elif connection and args.export:
+        try:
+            start = time.perf_counter()
+            exported = columnar.export_deals(connection, args.export, fmt=args.export_format)
+            print(f"Exported {exported:,} deals to '{args.export}' in {time.perf_counter() - start:.1f}s.")
+            if args.export_verify:
+                verified = columnar.verify_snapshot(connection, columnar.DEALS_EXPORT_SQL, args.export)
+                print(f"Verified {verified:,} rows against the deals table.")
+        except (OSError, RuntimeError, ValueError, sqlite3.Error) as e:
+            print(f"Export failed: {e}")
+        connection.close()
+    elif connection and args.search:
+        print_search_results(connection, args.search, limit=args.limit or search.SEARCH_LIMIT)
+        connection.close()
+    elif connection and args.under is not None:
+        print_deals_under(connection, args.under, limit=args.limit, offset=args.offset)
+        connection.close()
+    elif connection and (args.watch or args.watch_steam):
+        try:
+            key, price = args.watch or args.watch_steam
+            key_args = {"game_id": int(key)} if args.watch else {"steam_app_id": int(key)}
+            watch_id = alerts.add_watch(connection, target_price=float(price), min_savings=args.min_savings, **key_args)
+            print(f"Added watch {watch_id}.")
+        except (ValueError, sqlite3.Error) as e:
+            print(f"Cannot add watch: {e}")
+        connection.close()
+    elif connection and args.unwatch is not None:
+        removed = alerts.remove_watch(connection, args.unwatch)
+        print(f"Removed watch {args.unwatch}." if removed else f"Watch {args.unwatch} not found.")
+        connection.close()
+    elif connection and args.watchlist:
+        print_watchlist(connection)
+        connection.close()
+    elif connection:
+        # ตรวจ watchlist ระหว่าง sync (แสดงทาง console และเขียนลงไฟล์ถ้ากำหนด --alerts)
+        alert_file = alerts.JsonLinesSink(args.alerts) if args.alerts else None
+        alert_sink = alerts.CallbackSink(print_alert)
+        if alert_file:
+            alert_sink = alerts.FanOutSink(alert_sink, alert_file)
+        alert_engine = alerts.AlertEngine(connection, alert_sink)
+        if not alert_engine.size:
+            alert_engine = None
+        if args.bulk_load:
+            # 2-3. โหลดจากไฟล์ทีละ chunk
+            stats = bulk_load_deals(connection, replay.iter_replay_deals(args.bulk_load),
+                                    chunk_size=args.chunk_size, cold=args.cold, alert_engine=alert_engine)
+            inserted_count = stats.written
+            deals_data = True
+        elif args.crawl:
+            # 2-3. Crawl ทุกหน้าและบันทึกทีละหน้า
+            store_ids = [int(s) for s in args.stores.split(",")] if args.stores else None
+            stats = crawl_deals(connection, store_ids=store_ids, max_workers=args.workers,
+                                record_path=args.record, alert_engine=alert_engine)
+            inserted_count = stats.written
+            deals_data = True
+        elif args.replay:
+            # 2-3. อ่าน response ที่บันทึกไว้จากดิสก์ (ไม่ใช้ network) แล้วบันทึกทีละหน้าแบบเดียวกับ crawl
+            stats = sync_deals(connection, replay.iter_replay_pages(args.replay), alert_engine=alert_engine)
+            print(f"Replay complete: {stats}")
+            inserted_count = stats.written
+            deals_data = True
+        else:
+            # 2. Fetch Data
+            deals_data = fetch_deals_from_api(API_URL)
+            if deals_data and args.record:
+                replay.save_pages([deals_data], args.record)
 
+            if deals_data:
+                # 3. Insert Data
+                print("\nInserting data into database...")
+                inserted_count = insert_deals_data(connection, deals_data, alert_engine=alert_engine)
+                print(f"Data insertion complete. {inserted_count} records inserted or updated.")
+
+        if alert_engine:
+            print(f"{alert_engine.emitted} price-drop alerts from {alert_engine.size} watches.")
+        if alert_file:
+            alert_file.close()
+
+        if deals_data:
             # 4. Analyze Data
             if inserted_count > 0 or connection.execute("SELECT COUNT(*) FROM deals").fetchone()[0] > 0:
-                 analyze_deals_data(connection)
+                 cache = None if args.no_cache else report_cache.ReportCache(connection)
+                 report = analyze_deals_data(connection, engine=args.engine, cache=cache)
+                 if cache:
+                     cache.flush() # เขียนเวลาที่ hit ลง lastUsed ก่อนจบ process (LRU ข้าม process)
+                 if report and cache:
+                     source = "cache hit" if report.cached else "computed"
+                     print(f"Report {source} in {report.elapsed * 1000:.1f} ms "
+                           f"(data version {report_cache.get_data_version(connection)}).")
             else:
                  print("\nNo data available in the database for analysis.")
 
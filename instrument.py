@@ -0,0 +1,168 @@
+"""
+Instrumentation ของ pipeline: timing span และ counter ของแต่ละขั้นตอน (fetch, parse, insert, analyze)
+
+ปิดไว้เป็นค่าเริ่มต้น ระหว่างที่ปิด span() คืนค่า object ว่างตัวเดิมทุกครั้งและ count() return ทันที
+จุดที่วัดไว้ใน db.py/analytics.py จึงแทบไม่มีต้นทุน เมื่อเปิดด้วย start() ทุก record จะถูกเขียนเป็น
+JSON 1 บรรทัด (JSON lines) ลงไฟล์หรือ stderr
+- {"type": "span", "name": "insert", "ms": 12.3, "ts": ..., ...field ของ span}
+- {"type": "sql", "sql": "..."}: ทุก statement ที่ SQLite รัน (ถ้า attach_connection(sql=True))
+- {"type": "counters", "counters": {"fetch.bytes": ..., "deals.parsed": ..., ...}}: ผลรวมตอน stop()
+
+start(profile_path=...) เปิด cProfile ของ thread ที่เรียก start ด้วย แล้ว dump ไฟล์ .prof ตอน stop()
+(ดูด้วย python -m pstats ไฟล์.prof) ส่วน span และ counter บันทึกได้จากทุก thread
+"""
+
+import cProfile
+import json
+import sys
+import threading
+import time
+
+_tracer = None
+
+
+class _NullSpan:
+    """span ที่ไม่ทำอะไร (ใช้ระหว่างที่ปิด instrumentation)"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **fields):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """ช่วงเวลาของขั้นตอนหนึ่ง เขียน record ตอนออกจาก with (พร้อมชื่อ exception ถ้ามี)"""
+
+    __slots__ = ("tracer", "name", "fields", "start")
+
+    def __init__(self, tracer, name, fields):
+        self.tracer = tracer
+        self.name = name
+        self.fields = fields
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        record = {"type": "span", "name": self.name, "ms": round(elapsed * 1000, 3),
+                  "ts": round(time.time() - elapsed, 6)}
+        record.update(self.fields)
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        self.tracer.emit(record)
+        return False
+
+    def set(self, **fields):
+        """เพิ่ม field ระหว่าง span (เช่น จำนวนไบต์หลังดึงข้อมูลเสร็จ)"""
+        self.fields.update(fields)
+
+
+class Tracer:
+    """ผู้รับ record ของ span/counter ทั้งหมด (เขียนแบบ thread-safe)"""
+
+    def __init__(self, out, owns_out=False, profile_path=None):
+        self.out = out
+        self.owns_out = owns_out
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.profile_path = profile_path
+        self.profiler = cProfile.Profile() if profile_path else None
+
+    def emit(self, record):
+        if self.out is None:
+            return
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self.lock:
+            self.out.write(line)
+
+    def count(self, name, value):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+
+def start(path="-", profile_path=None):
+    """
+    เปิด instrumentation เขียน JSON lines ลง path ('-' = stderr, None = ไม่เขียน record)
+    และเปิด cProfile ถ้ากำหนด profile_path
+    """
+    global _tracer
+    stop()
+    if path is None or path == "-":
+        tracer = Tracer(sys.stderr if path else None, profile_path=profile_path)
+    else:
+        tracer = Tracer(open(path, "a", encoding="utf-8"), owns_out=True, profile_path=profile_path)
+    tracer.emit({"type": "start", "ts": round(time.time(), 6), "argv": sys.argv})
+    _tracer = tracer
+    if tracer.profiler:
+        tracer.profiler.enable()
+    return tracer
+
+
+def stop():
+    """ปิด instrumentation: เขียนผลรวมของ counter, dump cProfile (ถ้าเปิด) และปิดไฟล์ (เรียกซ้ำได้)"""
+    global _tracer
+    tracer = _tracer
+    if tracer is None:
+        return
+    _tracer = None
+    if tracer.profiler:
+        tracer.profiler.disable()
+        tracer.profiler.dump_stats(tracer.profile_path)
+    tracer.emit({"type": "counters", "ts": round(time.time(), 6), "counters": tracer.counters})
+    if tracer.owns_out:
+        tracer.out.close()
+    elif tracer.out is not None:
+        tracer.out.flush()
+
+
+def enabled():
+    """instrumentation เปิดอยู่หรือไม่"""
+    return _tracer is not None
+
+
+def span(name, **fields):
+    """context manager จับเวลาขั้นตอน name (ใช้ .set() เพิ่ม field ได้ระหว่าง span)"""
+    if _tracer is None:
+        return _NULL_SPAN
+    return _Span(_tracer, name, fields)
+
+
+def count(name, value=1):
+    """เพิ่มค่า counter name"""
+    if _tracer is None:
+        return
+    _tracer.count(name, value)
+
+
+def attach_connection(conn, sql=False, progress_steps=0):
+    """
+    ติดตั้ง callback ของ sqlite3 บน conn (ถ้า instrumentation เปิดอยู่)
+
+    sql=True: บันทึกทุก statement ที่รันเป็น record 'sql' (executemany ได้ 1 record ต่อแถว จึงมีต้นทุนสูง)
+    progress_steps > 0: นับจำนวน VM instruction ของ SQLite ลง counter 'sqlite.vm_steps' ทุกๆ progress_steps
+    """
+    tracer = _tracer
+    if tracer is None:
+        return
+    if sql:
+        conn.set_trace_callback(lambda statement: tracer.emit({"type": "sql", "sql": statement}))
+    if progress_steps:
+        def progress():
+            tracer.count("sqlite.vm_steps", progress_steps)
+            return 0 # 0 = ทำงานต่อ
+        conn.set_progress_handler(progress, progress_steps)
+
+
+def detach_connection(conn):
+    """ถอด callback ที่ attach_connection ติดตั้งไว้"""
+    conn.set_trace_callback(None)
+    conn.set_progress_handler(None, 0)
@@ -0,0 +1,110 @@
+"""
+แปลงข้อมูลดีลจาก JSON ของ CheapShark API เป็นแถวที่มีชนิดข้อมูลตรงกับตาราง deals
+
+DEAL_FIELDS ระบุชื่อคอลัมน์และชนิดข้อมูลแบบเดียวกับ CREATE TABLE deals (db.setup_database ตรวจให้ตรงกัน
+ด้วย db.check_deal_columns) แล้วถูกแปลงเป็น tuple ของตัวแปลงต่อฟิลด์ที่ convert_deal ใช้
+(เรียก deal.get ครั้งเดียวต่อฟิลด์ ไม่มี try/except ต่อดีล)
+normalize_deals แปลงทั้งหน้าในรอบเดียวด้วย map และจะวนทีละดีลเฉพาะเมื่อหน้านั้นมีดีลเสีย
+ดีลที่แปลงไม่ได้จะถูกส่งไปที่ reject sink แทนการ print ทีละรายการ
+"""
+
+from itertools import compress
+
+# (ชื่อคอลัมน์, ชนิดข้อมูลใน SQLite) ตามลำดับคอลัมน์ของ INSERT ใน insert_deals_data
+DEAL_FIELDS = (
+    ("internalName", "TEXT"),
+    ("title", "TEXT"),
+    ("metacriticLink", "TEXT"),
+    ("dealID", "TEXT"),
+    ("storeID", "INTEGER"),
+    ("gameID", "INTEGER"),
+    ("salePrice", "REAL"),
+    ("normalPrice", "REAL"),
+    ("isOnSale", "INTEGER"),
+    ("savings", "REAL"),
+    ("metacriticScore", "INTEGER"),
+    ("steamRatingText", "TEXT"),
+    ("steamRatingPercent", "INTEGER"),
+    ("steamRatingCount", "INTEGER"),
+    ("steamAppID", "INTEGER"),
+    ("releaseDate", "INTEGER"), # timestamp
+    ("lastChange", "INTEGER"), # timestamp
+    ("dealRating", "REAL"),
+    ("thumb", "TEXT"),
+)
+DEAL_COLUMNS = tuple(name for name, _ in DEAL_FIELDS)
+COLUMN_INDEX = {name: i for i, name in enumerate(DEAL_COLUMNS)}
+
+# ตัวแปลงค่าตามชนิดข้อมูล (None = ใช้ค่าจาก JSON ตามเดิม)
+_CONVERTERS = {"TEXT": None, "INTEGER": int, "REAL": float}
+# (ชื่อฟิลด์, ตัวแปลง) ตามลำดับ DEAL_COLUMNS สร้างครั้งเดียวตอน import จึงไม่ต้องอ่าน spec ซ้ำทุกดีล
+_FIELD_CONVERTERS = tuple((name, _CONVERTERS[sql_type]) for name, sql_type in DEAL_FIELDS)
+
+
+def convert_deal(deal):
+    """
+    แปลงดีล 1 รายการ (dict จาก JSON) เป็น tuple ตามลำดับ DEAL_COLUMNS
+
+    ค่าตัวเลขที่ว่าง/เป็น 0/None จะกลายเป็น None เหมือนเดิม (int(x) if x else None) ค่า TEXT ใช้ตามเดิม
+    """
+    get = deal.get
+    return tuple([get(name) if convert is None else (convert(value) if (value := get(name)) else None)
+                  for name, convert in _FIELD_CONVERTERS])
+
+
+class DealBatch:
+    """ดีล 1 หน้าที่แปลงแล้ว: rows คือ list ของ tuple ตามลำดับ DEAL_COLUMNS"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def column(self, name):
+        """ค่าทั้งคอลัมน์ของฟิลด์ name (list เรียงตามแถว)"""
+        i = COLUMN_INDEX[name]
+        return [row[i] for row in self.rows]
+
+    def select(self, selectors):
+        """Generator ของแถวที่ selectors เป็น True (ส่งให้ executemany ได้โดยตรง ไม่สร้าง list ใหม่)"""
+        return compress(self.rows, selectors)
+
+
+def _convert_one_by_one(records, rejects):
+    """แปลงทีละดีลเพื่อแยกดีลที่เสียออก (ใช้เฉพาะเมื่อการแปลงทั้งหน้าล้มเหลว) คืนค่า (rows, ดีลต้นฉบับของแต่ละแถว)"""
+    rows = []
+    kept = []
+    for record in records:
+        try:
+            rows.append(convert_deal(record))
+            kept.append(record)
+        except (ValueError, TypeError, AttributeError) as e:
+            if rejects is not None:
+                rejects.append((record, f"{type(e).__name__}: {e}"))
+    return rows, kept
+
+
+def normalize_deals(records, rejects=None):
+    """
+    แปลง list ของดีล (dict จาก JSON) เป็น DealBatch ในรอบเดียว
+
+    rejects: Optional reject sink (อะไรก็ได้ที่มี .append) รับ (record, เหตุผล) ของดีลที่ถูกตัดทิ้ง
+    """
+    if not isinstance(records, list):
+        records = list(records)
+    try:
+        rows = list(map(convert_deal, records))
+    except (ValueError, TypeError, AttributeError):
+        rows, records = _convert_one_by_one(records, rejects)
+
+    # ตรวจสอบข้อมูลที่จำเป็น (ต้องมี dealID และ title)
+    deal_id_index, title_index = COLUMN_INDEX["dealID"], COLUMN_INDEX["title"]
+    valid = [bool(row[deal_id_index] and row[title_index]) for row in rows]
+    if not all(valid):
+        if rejects is not None:
+            for record, ok in zip(records, valid):
+                if not ok:
+                    rejects.append((record, "missing dealID or title"))
+        rows = list(compress(rows, valid))
+    return DealBatch(rows)
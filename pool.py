@@ -0,0 +1,119 @@
+"""
+Connection pool สำหรับฐานข้อมูลดีล: writer 1 connection + reader แบบ read-only N connections
+
+SQLite ในโหมด WAL ให้ผู้อ่านหลายคนอ่านได้พร้อมกับผู้เขียน 1 คน ดังนั้น pool จึงมี
+- writer: connection เดียวที่สร้างผ่าน db.setup_database (schema/migration/PRAGMA ครบ) ใช้ได้ครั้งละ 1 thread ผ่าน lock
+- readers: connection แบบ mode=ro ที่ยืมได้จาก queue ทีละ thread (ไม่มี thread ไหนใช้ connection ร่วมกันพร้อมกัน)
+
+ทุก connection เปิดด้วย check_same_thread=False (pool เป็นผู้รับประกันว่าใช้ทีละ thread)
+และ cached_statements ขนาดใหญ่พอสำหรับ query ของรายงานทั้งหมด เพื่อให้ statement ที่ prepare แล้ว
+ถูกใช้ซ้ำใน connection เดิมโดยไม่ต้อง parse SQL ใหม่
+sqlite3 ปล่อย GIL ระหว่างรัน query จึงรัน query หลายตัวพร้อมกันด้วย thread ได้จริง
+"""
+
+import contextlib
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+from analytics import DealsReport, REPORT_QUERIES, TIMESTAMP_2015
+
+POOL_READERS = 4
+STATEMENT_CACHE_SIZE = 256 # จำนวน prepared statement ที่ cache ไว้ต่อ connection
+
+# PRAGMA ของ reader: ชุดเดียวกับ db.CONNECTION_PRAGMAS ยกเว้นค่าที่เกี่ยวกับการเขียน
+# (journal_mode เป็นของไฟล์ ถูกตั้งเป็น WAL โดย writer แล้ว, synchronous มีผลเฉพาะตอน commit)
+READER_PRAGMAS = [(name, value) for name, value in db.CONNECTION_PRAGMAS
+                  if name not in ("journal_mode", "synchronous")]
+
+
+class ConnectionPool:
+    """pool ของ writer 1 connection และ reader แบบ read-only หลาย connection บนไฟล์ฐานข้อมูลเดียวกัน"""
+
+    def __init__(self, db_path, readers=POOL_READERS, statement_cache_size=STATEMENT_CACHE_SIZE):
+        self.db_path = db_path
+        self._writer = db.setup_database(db_path, check_same_thread=False,
+                                         cached_statements=statement_cache_size)
+        if self._writer is None:
+            raise sqlite3.OperationalError(f"Cannot open database '{db_path}'")
+        self._writer_lock = threading.Lock()
+        self._readers = queue.Queue()
+        self._all_readers = []
+        for _ in range(readers):
+            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False,
+                                   cached_statements=statement_cache_size)
+            for name, value in READER_PRAGMAS:
+                conn.execute(f"PRAGMA {name} = {value}")
+            self._readers.put(conn)
+            self._all_readers.append(conn)
+        self.size = readers
+
+    @contextlib.contextmanager
+    def writer(self):
+        """ยืม writer connection (รอจนกว่า thread อื่นจะใช้เสร็จ)"""
+        with self._writer_lock:
+            yield self._writer
+
+    @contextlib.contextmanager
+    def reader(self):
+        """ยืม reader connection ว่างจาก pool (รอถ้าทุก connection ถูกใช้อยู่)"""
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    def query(self, sql, params=()):
+        """รัน SELECT บน reader ว่าง คืนค่า list ของแถว"""
+        with self.reader() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def query_many(self, queries):
+        """
+        รันหลาย query พร้อมกันบน reader ทุกตัว
+
+        queries: dict ชื่อ -> (sql, params) คืนค่า dict ชื่อ -> list ของแถว
+        แต่ละ query อ่านจาก snapshot ของ reader ตัวเอง ถ้ามีการเขียนพร้อมกันผลแต่ละข้ออาจมาจากคนละ transaction
+        """
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            futures = {name: executor.submit(self.query, sql, params) for name, (sql, params) in queries.items()}
+            return {name: future.result() for name, future in futures.items()}
+
+    def close(self):
+        """ปิดทุก connection"""
+        for conn in self._all_readers:
+            conn.close()
+        self._writer.close()
+
+
+def parallel_report(pool, released_before=TIMESTAMP_2015):
+    """
+    สร้าง DealsReport ด้วย SQL ชุดเดียวกับ analytics.run_report_queries แต่รัน query ที่ไม่ขึ้นต่อกันพร้อมกัน
+
+    มีเพียงรายงาน top 10% (ต้องใช้จุดตัดจาก query ก่อนหน้า) ที่รันต่อจากรอบแรก
+    """
+    start = time.perf_counter()
+    q = REPORT_QUERIES
+    independent = {name: (sql, ()) for name, sql in q.items() if name != "top10_review_count"}
+    independent["released_before"] = (q["released_before"], (released_before,))
+    rows = pool.query_many(independent)
+
+    report = DealsReport(engine="parallel")
+    report.total_deals = rows["total_deals"][0][0]
+    report.top_savings = rows["top_savings"]
+    report.top_metacritic = rows["top_metacritic"]
+    report.top_steam_rating = rows["top_steam_rating"]
+    report.avg_steam_rating = rows["avg_steam_rating"][0][0]
+    report.rating_text_counts = rows["rating_text_counts"]
+    report.above_avg_metacritic = rows["above_avg_metacritic"]
+    report.above_avg_steam_rating = rows["above_avg_steam_rating"]
+    report.high_rated_savings = rows["high_rated_savings"]
+    report.top10_review_cutoff = rows["top10_review_cutoff"][0][0]
+    if report.top10_review_cutoff is not None:
+        report.top10_review_count = pool.query(q["top10_review_count"], (report.top10_review_cutoff,))
+    report.released_before = rows["released_before"]
+    report.elapsed = time.perf_counter() - start
+    return report
@@ -0,0 +1,124 @@
+"""
+Price history สำหรับดีลเกม CheapShark
+
+เก็บประวัติราคา (salePrice) ของแต่ละดีลแบบ append-only ในตาราง 'deal_price_history'
+แต่ละแถวคือการสังเกตราคา 1 ครั้ง: (dealKey, observedAt, priceCents)
+- dealKey คือ deals.id (INTEGER) แทน dealID ที่เป็น string ยาว ~40 ตัวอักษร
+- observedAt คือ timestamp (ใช้ lastChange จาก API)
+- priceCents คือราคาเป็นเซนต์ (INTEGER) ซึ่ง SQLite เก็บแบบ variable-length ได้เล็กกว่า REAL 8 ไบต์
+
+ตารางเป็น WITHOUT ROWID โดยมี PRIMARY KEY (dealKey, observedAt) ดังนั้นข้อมูลของดีลเดียวกัน
+จะเรียงติดกันตามเวลาใน B-tree เดียว การค้นหาช่วงเวลาของดีลหนึ่งจึงเป็น range scan ขนาด O(log n + k)
+ไม่ว่าประวัติทั้งหมดจะโตเป็นหลายร้อยล้านแถวก็ตาม
+"""
+
+import time
+
+HISTORY_TABLE = "deal_price_history"
+
+CREATE_HISTORY_TABLE_SQL = f'''
+    CREATE TABLE IF NOT EXISTS {HISTORY_TABLE} (
+        dealKey INTEGER NOT NULL, -- deals.id
+        observedAt INTEGER NOT NULL, -- Timestamp ที่ราคานี้เริ่มมีผล
+        priceCents INTEGER NOT NULL, -- salePrice * 100
+        PRIMARY KEY (dealKey, observedAt)
+    ) WITHOUT ROWID
+'''
+
+# เพิ่มประวัติโดยอ้าง dealKey จาก dealID ผ่าน UNIQUE index ของ deals (ไม่ต้อง query id แยก)
+RECORD_PRICE_SQL = f'''
+    INSERT OR IGNORE INTO {HISTORY_TABLE}(dealKey, observedAt, priceCents)
+    SELECT id, ?, ? FROM deals WHERE dealID = ?
+'''
+
+
+def to_cents(price):
+    """แปลงราคา (float) เป็นเซนต์ (int)"""
+    return int(round(price * 100))
+
+
+def create_price_history_table(cursor):
+    """สร้างตาราง deal_price_history ถ้ายังไม่มี และ backfill ราคาปัจจุบันของดีลที่มีอยู่แล้ว"""
+    exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (HISTORY_TABLE,)
+    ).fetchone()
+    cursor.execute(CREATE_HISTORY_TABLE_SQL)
+    if not exists:
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO {HISTORY_TABLE}(dealKey, observedAt, priceCents)
+            SELECT id, COALESCE(lastChange, ?), CAST(ROUND(salePrice * 100) AS INTEGER)
+            FROM deals WHERE salePrice IS NOT NULL
+        ''', (int(time.time()),))
+
+
+def record_price_changes(cursor, changes):
+    """
+    บันทึกการเปลี่ยนราคาลงประวัติ (ไม่ commit เอง ให้ผู้เรียก commit พร้อม deals)
+
+    changes: iterable ของ (dealID, observedAt, salePrice)
+    """
+    now = int(time.time())
+    cursor.executemany(RECORD_PRICE_SQL, (
+        (observed_at if observed_at is not None else now, to_cents(price), deal_id)
+        for deal_id, observed_at, price in changes
+    ))
+
+
+def _deal_key(conn, deal_id):
+    """หา deals.id จาก dealID (None ถ้าไม่พบ)"""
+    row = conn.execute("SELECT id FROM deals WHERE dealID = ?", (deal_id,)).fetchone()
+    return row[0] if row else None
+
+
+def _price_in_effect(conn, deal_key, at):
+    """ราคาที่มีผลอยู่ ณ เวลา at (การสังเกตล่าสุดที่ไม่เกิน at) หน่วยเป็นเซนต์"""
+    row = conn.execute(f'''
+        SELECT priceCents FROM {HISTORY_TABLE}
+        WHERE dealKey = ? AND observedAt <= ?
+        ORDER BY observedAt DESC LIMIT 1
+    ''', (deal_key, at)).fetchone()
+    return row[0] if row else None
+
+
+def get_price_history(conn, deal_id, start=None, end=None):
+    """คืนค่า list ของ (observedAt, price) ของดีลในช่วงเวลา [start, end] เรียงตามเวลา"""
+    deal_key = _deal_key(conn, deal_id)
+    if deal_key is None:
+        return []
+    cursor = conn.execute(f'''
+        SELECT observedAt, priceCents FROM {HISTORY_TABLE}
+        WHERE dealKey = ? AND observedAt >= ? AND observedAt <= ?
+        ORDER BY observedAt
+    ''', (deal_key, start if start is not None else 0, end if end is not None else 2 ** 62))
+    return [(observed_at, cents / 100) for observed_at, cents in cursor]
+
+
+def get_price_stats(conn, deal_id, start=None, end=None):
+    """
+    คืนค่า (min_price, max_price, observations) ของดีลในช่วงเวลา [start, end]
+
+    นับรวมราคาที่มีผลอยู่ ณ เวลา start ด้วย (ราคาที่ตั้งไว้ก่อนช่วงเวลาแต่ยังใช้อยู่)
+    คืนค่า None ถ้าไม่มีข้อมูลราคาในช่วงนั้น
+    """
+    deal_key = _deal_key(conn, deal_id)
+    if deal_key is None:
+        return None
+    low, high, count = conn.execute(f'''
+        SELECT MIN(priceCents), MAX(priceCents), COUNT(*) FROM {HISTORY_TABLE}
+        WHERE dealKey = ? AND observedAt >= ? AND observedAt <= ?
+    ''', (deal_key, start if start is not None else 0, end if end is not None else 2 ** 62)).fetchone()
+    if start is not None:
+        carried = _price_in_effect(conn, deal_key, start)
+        if carried is not None:
+            low = carried if low is None else min(low, carried)
+            high = carried if high is None else max(high, carried)
+    if low is None:
+        return None
+    return low / 100, high / 100, count
+
+
+def get_lowest_price(conn, deal_id, days=90, now=None):
+    """ราคาต่ำสุดของดีลในช่วง days วันที่ผ่านมา (None ถ้าไม่มีข้อมูล)"""
+    now = int(now if now is not None else time.time())
+    stats = get_price_stats(conn, deal_id, start=now - days * 86400, end=now)
+    return stats[0] if stats else None
@@ -0,0 +1,182 @@
+"""
+Replay: อ่าน response ของ CheapShark API ที่บันทึกไว้บนดิสก์แทนการดึงจาก network
+
+รองรับไฟล์ 3 แบบ (และแบบบีบอัด .gz ของทุกแบบ)
+- JSON array ทั้งไฟล์ (response 1 หน้าตามที่ API ส่งมา)
+- JSONL ที่แต่ละบรรทัดเป็นดีล 1 รายการ
+- JSONL ที่แต่ละบรรทัดเป็น 1 หน้า (JSON array) ซึ่งเป็นรูปแบบที่ record_pages เขียน
+
+ไฟล์ถูก parse แบบ incremental: อ่านทีละ chunk จาก mmap (ไฟล์ปกติ) หรือ gzip stream
+แล้วใช้ JSONDecoder.raw_decode แยกทีละดีล array ระดับบนสุดจะถูกอ่านทีละสมาชิก
+จึงไม่ต้องโหลดทั้งไฟล์หรือทั้ง array เข้า memory เหมือน json.load
+"""
+
+import codecs
+import gzip
+import json
+import mmap
+import os
+import re
+
+REPLAY_READ_SIZE = 1 << 20 # อ่านครั้งละ 1 MiB
+REPLAY_PAGE_SIZE = 60 # จำนวนดีลต่อหน้าเมื่อรวมเป็นหน้า (เท่า pageSize ของ API)
+ARCHIVE_SUFFIXES = (".json", ".jsonl", ".json.gz", ".jsonl.gz")
+
+GZIP_MAGIC = b"\x1f\x8b"
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_DECODER = json.JSONDecoder()
+
+
+def _open_stream(file):
+    """คืนค่า stream แบบ binary ที่มี .read(n): mmap สำหรับไฟล์ปกติ หรือ GzipFile ถ้าเป็นไฟล์ gzip"""
+    if file.read(2) == GZIP_MAGIC:
+        file.seek(0)
+        return gzip.GzipFile(fileobj=file, mode="rb")
+    file.seek(0)
+    if os.fstat(file.fileno()).st_size == 0:
+        return None # mmap ไฟล์ขนาด 0 ไม่ได้
+    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def iter_json_values(stream, read_size=REPLAY_READ_SIZE):
+    """
+    Generator แยก JSON value ระดับบนสุดจาก stream แบบ binary (UTF-8) ทีละตัว
+
+    value ที่คั่นด้วย whitespace/บรรทัดใหม่จะถูก yield ทีละตัว (JSONL)
+    ถ้า value ระดับบนสุดเป็น array จะ yield สมาชิกทีละตัวแทนทั้ง array
+    ข้อมูลผิดรูปแบบจะ raise ValueError พร้อมตำแหน่ง (นับเป็นตัวอักษร)
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    pos = 0
+    offset = 0 # จำนวนตัวอักษรที่ตัดทิ้งไปจาก buf แล้ว (ใช้รายงานตำแหน่งที่ผิด)
+    eof = False
+    in_array = False
+    expect_comma = False # ใน array: อ่านสมาชิกแล้ว ต่อไปต้องเป็น ',' หรือ ']'
+    after_comma = False # ใน array: เพิ่งอ่าน ',' ต่อไปต้องเป็นสมาชิก
+
+    while True:
+        pos = _WHITESPACE.match(buf, pos).end()
+        # เติม buffer เมื่อใกล้หมด (ต้องมีอย่างน้อย 1 ตัวอักษรเพื่อดูว่าต่อไปคืออะไร)
+        if pos >= len(buf):
+            if eof:
+                break
+            chunk = stream.read(read_size)
+            eof = not chunk
+            offset += pos
+            buf = buf[pos:] + decoder.decode(chunk, final=eof)
+            pos = 0
+            continue
+
+        char = buf[pos]
+        if in_array:
+            if char == "]" and not after_comma:
+                in_array = False
+                expect_comma = False
+                pos += 1
+                continue
+            if expect_comma:
+                if char != ",":
+                    raise ValueError(f"Expected ',' or ']' at character {offset + pos}")
+                expect_comma = False
+                after_comma = True
+                pos += 1
+                continue
+        elif char == "[":
+            in_array = True
+            pos += 1
+            continue
+
+        try:
+            value, end = _DECODER.raw_decode(buf, pos)
+        except json.JSONDecodeError as e:
+            if eof:
+                raise ValueError(f"Invalid JSON at character {offset + e.pos}: {e.msg}") from None
+            end = None
+        # value ที่จบพอดีท้าย buffer อาจถูกตัด (เช่น ตัวเลข) จึงอ่านเพิ่มก่อนแล้ว parse ใหม่
+        if end is None or (end == len(buf) and not eof):
+            chunk = stream.read(read_size)
+            eof = not chunk
+            offset += pos
+            buf = buf[pos:] + decoder.decode(chunk, final=eof)
+            pos = 0
+            continue
+        pos = end
+        expect_comma = in_array
+        after_comma = False
+        yield value
+
+    if in_array:
+        raise ValueError("Unexpected end of file inside JSON array")
+
+
+def iter_archive_deals(path, read_size=REPLAY_READ_SIZE):
+    """Generator อ่านดีลทีละรายการจากไฟล์ archive 1 ไฟล์ (JSON array / JSONL / .gz)"""
+    with open(path, "rb") as file:
+        stream = _open_stream(file)
+        if stream is None:
+            return
+        try:
+            for value in iter_json_values(stream, read_size):
+                # บรรทัดที่เป็น 1 หน้า (array ซ้อนใน array ระดับบนสุด) จะถูกแตกเป็นทีละดีล
+                if isinstance(value, list):
+                    yield from value
+                else:
+                    yield value
+        finally:
+            stream.close()
+
+
+def expand_archive_paths(paths):
+    """แปลง list ของไฟล์/โฟลเดอร์เป็น list ของไฟล์ archive (ไฟล์ในโฟลเดอร์เรียงตามชื่อเพื่อให้ได้ลำดับเดิมทุกครั้ง)"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.endswith(ARCHIVE_SUFFIXES)
+            ))
+        else:
+            files.append(path)
+    return files
+
+
+def iter_replay_deals(paths, read_size=REPLAY_READ_SIZE):
+    """Generator อ่านดีลจากหลายไฟล์ต่อกัน ไฟล์ที่อ่านไม่ได้หรือผิดรูปแบบจะถูกข้าม (ดีลก่อนจุดที่ผิดยังถูกใช้)"""
+    for path in expand_archive_paths(paths):
+        try:
+            yield from iter_archive_deals(path, read_size)
+        except (OSError, ValueError, EOFError) as e:
+            print(f"Error replaying {path}: {e}")
+
+
+def iter_replay_pages(paths, page_size=REPLAY_PAGE_SIZE, read_size=REPLAY_READ_SIZE):
+    """Generator ของหน้า (list ดีลไม่เกิน page_size รายการ) สำหรับส่งให้ sync_deals/insert_deals_data"""
+    page = []
+    for deal in iter_replay_deals(paths, read_size):
+        page.append(deal)
+        if len(page) >= page_size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def record_pages(pages, path):
+    """
+    Generator ที่ส่งต่อหน้าเดิมทุกหน้า และบันทึกแต่ละหน้าลงไฟล์เป็น JSONL (1 บรรทัด = 1 หน้า)
+
+    ถ้า path ลงท้ายด้วย .gz จะบีบอัดด้วย gzip ไฟล์ที่ได้ใช้กับ --replay ได้ทันที
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "wt", encoding="utf-8") as f:
+        for page in pages:
+            f.write(json.dumps(page, separators=(",", ":")))
+            f.write("\n")
+            yield page
+
+
+def save_pages(pages, path):
+    """บันทึกทุกหน้าลงไฟล์ในรูปแบบเดียวกับ record_pages (ใช้เมื่อไม่ต้องส่งต่อหน้า)"""
+    for _ in record_pages(pages, path):
+        pass
@@ -0,0 +1,174 @@
+"""
+Cache ผลลัพธ์รายงานในตาราง 'report_cache' ของฐานข้อมูลเดียวกัน
+
+ทุกครั้งที่ตาราง deals มีแถวถูกเพิ่ม/แก้ไข/หมดอายุจริง ผู้เขียนจะเรียก bump_data_version
+ใน transaction เดียวกัน (ดีลที่ไม่เปลี่ยนจะไม่เพิ่มเวอร์ชัน) ผลลัพธ์ใน cache จะถูกใช้ต่อเมื่อ
+ถูกคำนวณจาก data version เดียวกับปัจจุบันเท่านั้น จึงไม่ต้องไล่ลบ cache เมื่อข้อมูลเปลี่ยน
+
+key ของ cache คือชื่อรายงาน + parameter (JSON) ค่าที่เก็บเป็น JSON
+จำนวนรายการถูกจำกัดด้วย max_entries โดยลบรายการที่ถูกใช้ล่าสุดนานที่สุดออกก่อน (LRU)
+cache hit เป็นการอ่านอย่างเดียว (ไม่ต้องรอ write lock ระหว่าง ingest) เวลาที่ถูกใช้ล่าสุดจะจำไว้ใน memory
+แล้วเขียนลงคอลัมน์ lastUsed ตอน put ครั้งถัดไป หรือตอน flush() (เรียกก่อนเลิกใช้ cache)
+การเขียนของ put/flush เป็นแบบ best-effort: บน connection แบบ read-only (เช่น reader ของ pool.py)
+หรือเมื่อฐานข้อมูลถูก lock นานเกิน timeout จะข้ามการเขียนไป (นับใน skipped_writes) ผลลัพธ์ยังถูกต้อง
+แต่ cache จะ hit ได้เฉพาะรายการที่ connection ที่เขียนได้เคยเก็บไว้
+"""
+
+import json
+import sqlite3
+import time
+
+CACHE_TABLE = "report_cache"
+DATA_VERSION_TABLE = "deal_data_version"
+DEFAULT_MAX_ENTRIES = 64
+
+CACHE_MIGRATION = [
+    f'''CREATE TABLE IF NOT EXISTS {DATA_VERSION_TABLE} (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    )''',
+    f"INSERT OR IGNORE INTO {DATA_VERSION_TABLE}(id, version) VALUES (1, 0)",
+    f'''CREATE TABLE IF NOT EXISTS {CACHE_TABLE} (
+        cacheKey TEXT PRIMARY KEY, -- ชื่อรายงาน + parameter
+        dataVersion INTEGER NOT NULL, -- data version ตอนคำนวณ
+        payload TEXT NOT NULL, -- ผลลัพธ์ (JSON)
+        lastUsed REAL NOT NULL -- เวลาที่ถูกใช้ล่าสุด (สำหรับ LRU)
+    ) WITHOUT ROWID''',
+]
+
+
+def bump_data_version(cursor):
+    """เพิ่ม data version (ไม่ commit เอง ให้ commit พร้อมการเขียน deals)"""
+    cursor.execute(f"UPDATE {DATA_VERSION_TABLE} SET version = version + 1 WHERE id = 1")
+
+
+def get_data_version(conn):
+    """data version ปัจจุบัน (None ถ้ายังไม่มีตาราง)"""
+    try:
+        row = conn.execute(f"SELECT version FROM {DATA_VERSION_TABLE} WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+def _is_unwritable(error):
+    """error นี้เกิดจาก connection แบบ read-only หรือฐานข้อมูลถูก lock (ไม่ใช่ข้อผิดพลาดของ SQL)"""
+    return getattr(error, "sqlite_errorcode", 0) & 0xFF in (sqlite3.SQLITE_READONLY, sqlite3.SQLITE_BUSY)
+
+
+def make_cache_key(name, params=()):
+    """สร้าง key จากชื่อรายงานและ parameter"""
+    return f"{name}:{json.dumps(list(params), separators=(',', ':'))}"
+
+
+class ReportCache:
+    """cache ผลรายงานบน connection เดียว พร้อมนับ hit/miss/eviction ของ process นี้"""
+
+    def __init__(self, conn, max_entries=DEFAULT_MAX_ENTRIES):
+        self.conn = conn
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.skipped_writes = 0
+        self.last_used = {} # cacheKey -> เวลาที่ hit ล่าสุดที่ยังไม่ได้เขียนลงตาราง
+
+    def get(self, key, version):
+        """คืนค่าผลลัพธ์ที่คำนวณจาก version นี้ (None ถ้าไม่มี)"""
+        row = self.conn.execute(
+            f"SELECT payload FROM {CACHE_TABLE} WHERE cacheKey = ? AND dataVersion = ?", (key, version)
+        ).fetchone()
+        if row is None:
+            return None
+        self.last_used[key] = time.time()
+        return json.loads(row[0])
+
+    def put(self, key, version, value):
+        """
+        บันทึกผลลัพธ์ ลบรายการที่คำนวณจาก version เก่า และรายการเกิน max_entries (LRU)
+        เวลาที่ hit ล่าสุดของรายการอื่น (จาก get) ถูกเขียนลง lastUsed ก่อนเลือกรายการที่จะลบ
+        คืนค่า False ถ้าข้ามการเขียน (connection แบบ read-only หรือฐานข้อมูลถูก lock)
+        """
+        def write():
+            self._write_last_used()
+            self.conn.execute(f"DELETE FROM {CACHE_TABLE} WHERE dataVersion < ?", (version,))
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {CACHE_TABLE}(cacheKey, dataVersion, payload, lastUsed) VALUES (?, ?, ?, ?)",
+                (key, version, json.dumps(value), time.time()),
+            )
+            cursor = self.conn.execute(f'''
+                DELETE FROM {CACHE_TABLE} WHERE cacheKey IN (
+                    SELECT cacheKey FROM {CACHE_TABLE} ORDER BY lastUsed DESC LIMIT -1 OFFSET ?
+                )
+            ''', (self.max_entries,))
+            return cursor.rowcount
+
+        evicted = self._try_write(write)
+        if evicted is None:
+            return False
+        self.evictions += evicted
+        return True
+
+    def flush(self):
+        """เขียนเวลาที่ hit ค้างไว้ลง lastUsed (เรียกก่อนเลิกใช้ cache) คืนค่า False ถ้าข้ามการเขียน"""
+        if not self.last_used:
+            return True
+        return self._try_write(self._write_last_used) is not None
+
+    def _write_last_used(self):
+        """เขียนเวลาที่ hit ค้างไว้ลง lastUsed (ไม่ commit เอง) คืนค่าจำนวนแถวที่อัปเดต"""
+        return self.conn.executemany(f"UPDATE {CACHE_TABLE} SET lastUsed = MAX(lastUsed, ?) WHERE cacheKey = ?",
+                                     [(used, cache_key) for cache_key, used in self.last_used.items()]).rowcount
+
+    def _try_write(self, write):
+        """รัน write() แล้ว commit คืนค่าผลของ write() หรือ None ถ้า connection เขียนไม่ได้ตอนนี้"""
+        try:
+            result = write()
+            self.conn.commit()
+        except sqlite3.OperationalError as e:
+            self.conn.rollback()
+            if not _is_unwritable(e):
+                raise
+            self.skipped_writes += 1
+            return None
+        self.last_used.clear()
+        return result
+
+    def get_or_compute(self, name, params, compute):
+        """
+        คืนค่าผลลัพธ์ของรายงาน name จาก cache หรือเรียก compute() แล้วเก็บผลไว้
+
+        compute ต้องคืนค่าที่แปลงเป็น JSON ได้ คืนค่า (ผลลัพธ์, True ถ้ามาจาก cache)
+        """
+        # อ่านเวอร์ชันก่อนคำนวณ: ถ้ามีการเขียนระหว่างคำนวณ ผลจะถูกเก็บด้วยเวอร์ชันเก่าและไม่ถูกใช้อีก
+        version = get_data_version(self.conn)
+        key = make_cache_key(name, params)
+        if version is not None:
+            value = self.get(key, version)
+            if value is not None:
+                self.hits += 1
+                return value, True
+        self.misses += 1
+        value = compute()
+        if version is not None:
+            self.put(key, version, value)
+        return value, False
+
+    def clear(self):
+        """ลบทุกรายการใน cache"""
+        self.conn.execute(f"DELETE FROM {CACHE_TABLE}")
+        self.conn.commit()
+        self.last_used.clear()
+
+    def stats(self):
+        """คืนค่า dict ของ hits, misses, evictions, skipped_writes, entries และ hit_rate"""
+        entries = self.conn.execute(f"SELECT COUNT(*) FROM {CACHE_TABLE}").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "skipped_writes": self.skipped_writes,
+            "entries": entries,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,138 @@
+"""
+ค้นหาดีลจากชื่อเกมด้วย SQLite FTS5
+
+ตาราง 'deals_fts' เป็น FTS5 แบบ external content (อ้างแถวของ deals ด้วย id ไม่เก็บ title ซ้ำ)
+ใช้ tokenizer แบบ trigram จึงค้นหาได้ทั้ง substring/prefix ("witch" เจอ "The Witcher 3") แบบไม่สนตัวพิมพ์
+trigger ของ deals อัปเดต index ทุกครั้งที่เพิ่ม/ลบ/เปลี่ยน title (เหมือนตารางสรุปรายงานใน analytics)
+
+search_deals ค้นหา 2 ขั้น
+1. substring ตรงตัว (MATCH วลีของทั้งคำค้น)
+2. ถ้ายังได้ไม่ครบ limit: fuzzy โดยแตกคำค้นเป็น trigram แล้ว OR กัน ดีลที่มี trigram ตรงมากกว่า
+   (รวมถึงชื่อที่พิมพ์ผิด 1-2 ตัวอักษร) จะได้คะแนน bm25 ดีกว่า โดยเลือก trigram ที่พบน้อยที่สุดก่อน
+   (ดูจำนวนดีลต่อ trigram จาก fts5vocab) จนจำนวนดีลที่ต้องจัดอันดับรวมกันไม่เกิน FUZZY_CANDIDATE_BUDGET
+   trigram ที่พบแทบทุกดีล (เช่น "gam" ในทุกชื่อที่มีคำว่า Game) จึงไม่ทำให้ต้องจัดอันดับทั้งตาราง
+ลำดับผลลัพธ์ใช้ bm25 ที่ normalize เทียบกับดีลที่ตรงที่สุด (0-1) บวกน้ำหนักจาก dealRating และ savings
+ดีลที่คะแนนดีลสูง/ลดราคามากจึงขึ้นก่อน แม้คำค้นจะอยู่ในแทบทุกชื่อ (bm25 ใกล้ 0 ทุกดีล)
+คำค้นที่ตรงกับดีลจำนวนมาก จะจัดอันดับเฉพาะ SEARCH_MAX_CANDIDATES ดีลที่ bm25 ดีที่สุด
+(ORDER BY rank LIMIT ของ FTS5 ซึ่งเก็บแค่ top-N ระหว่างอ่าน ไม่ต้อง sort ทุกดีลที่ตรง)
+"""
+
+import re
+
+SEARCH_TABLE = "deals_fts"
+VOCAB_TABLE = "deals_fts_vocab"
+SEARCH_LIMIT = 10
+RATING_WEIGHT = 0.25 # น้ำหนักของ dealRating (0-10) ในคะแนน (ความเกี่ยวข้องมีน้ำหนัก 1)
+SAVINGS_WEIGHT = 0.25 # น้ำหนักของ savings (0-100%) ในคะแนน
+SEARCH_MAX_CANDIDATES = 5000 # จำนวนดีลที่ bm25 ดีที่สุดที่นำมาจัดอันดับต่อ 1 query
+FUZZY_MAX_TRIGRAMS = 12 # จำนวน trigram สูงสุดที่ใช้ใน fuzzy query
+FUZZY_CANDIDATE_BUDGET = 20000 # ผลรวมจำนวนดีลของ trigram ที่เลือกสำหรับ fuzzy query
+
+_INDEX_ROW = f"INSERT INTO {SEARCH_TABLE}(rowid, title) VALUES (new.id, new.title);"
+_REMOVE_ROW = f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, title) VALUES ('delete', old.id, old.title);"
+
+SEARCH_MIGRATION = [
+    f'''CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        title, content='deals', content_rowid='id', tokenize='trigram'
+    )''',
+    # ตารางจำนวนดีลต่อ trigram (ใช้เลือก trigram ที่พบน้อยสำหรับ fuzzy search)
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {VOCAB_TABLE} USING fts5vocab({SEARCH_TABLE}, row)",
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')",
+    f"CREATE TRIGGER IF NOT EXISTS trg_deals_fts_insert AFTER INSERT ON deals BEGIN {_INDEX_ROW} END",
+    f"CREATE TRIGGER IF NOT EXISTS trg_deals_fts_delete AFTER DELETE ON deals BEGIN {_REMOVE_ROW} END",
+    f'''CREATE TRIGGER IF NOT EXISTS trg_deals_fts_update AFTER UPDATE OF title ON deals
+        WHEN old.title IS NOT new.title
+        BEGIN {_REMOVE_ROW} {_INDEX_ROW} END''',
+]
+
+# คะแนน (มาก = ดี): bm25 ติดลบ (น้อย = ตรงมาก) หารด้วย bm25 ที่ดีที่สุดในกลุ่มได้ความเกี่ยวข้อง 0-1
+# (ทุกดีลเท่ากันถ้า bm25 เป็น 0 ทั้งหมด) แล้วบวกน้ำหนักของ dealRating/savings
+_SEARCH_SQL = f'''
+    WITH matches AS (
+        SELECT rowid AS id, rank AS relevance FROM {SEARCH_TABLE}
+        WHERE {SEARCH_TABLE} MATCH ? ORDER BY rank LIMIT ?
+    )
+    SELECT d.dealID, d.title, d.salePrice, d.savings, d.dealRating,
+           IFNULL(m.relevance / NULLIF(MIN(m.relevance) OVER (), 0), 1)
+           + ? * IFNULL(d.dealRating, 0) / 10 + ? * IFNULL(d.savings, 0) / 100 AS score
+    FROM matches m JOIN deals d ON d.id = m.id
+    ORDER BY score DESC
+    LIMIT ?
+'''
+
+
+def rebuild_search_index(conn):
+    """สร้าง index ค้นหาใหม่ทั้งหมดจากตาราง deals (ใช้หลัง bulk load ที่ปิด trigger ไว้; ไม่ commit เอง)"""
+    conn.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+
+
+def _normalize_query(text):
+    """ตัดช่องว่างซ้ำและแปลงเป็นตัวพิมพ์เล็ก"""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def _phrase(text):
+    """ครอบข้อความเป็นวลีของ FTS5 (escape เครื่องหมาย ")"""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _trigrams(text):
+    """trigram ที่ไม่ซ้ำของแต่ละคำในข้อความ (ไม่ข้ามช่องว่างระหว่างคำ)"""
+    grams = []
+    for word in text.split(" "):
+        for i in range(len(word) - 2):
+            gram = word[i:i + 3]
+            if gram not in grams:
+                grams.append(gram)
+    return grams
+
+
+def _fuzzy_terms(conn, text):
+    """เลือก trigram สำหรับ fuzzy query: ตัวที่มีใน index เรียงจากพบน้อยไปมาก จนจำนวนดีลรวมเกิน budget"""
+    grams = _trigrams(text)
+    if not grams:
+        return []
+    placeholders = ",".join("?" * len(grams))
+    present = sorted((doc, term) for term, doc in conn.execute(
+        f"SELECT term, doc FROM {VOCAB_TABLE} WHERE term IN ({placeholders})", grams))
+    chosen = []
+    candidates = 0
+    for doc, term in present[:FUZZY_MAX_TRIGRAMS]:
+        if chosen and candidates + doc > FUZZY_CANDIDATE_BUDGET:
+            break
+        chosen.append(term)
+        candidates += doc
+    return chosen
+
+
+def search_deals(conn, query, limit=SEARCH_LIMIT, fuzzy=True):
+    """
+    ค้นหาดีลจากชื่อเกม คืนค่า list ของ (dealID, title, salePrice, savings, dealRating, score) เรียงตามความเกี่ยวข้อง
+
+    fuzzy=True: ถ้า substring ตรงตัวได้ไม่ครบ limit จะเติมด้วยผลแบบ fuzzy (รองรับการพิมพ์ผิด)
+    คำค้นสั้นกว่า 3 ตัวอักษรใช้ trigram ไม่ได้ จึงค้นหาเป็น prefix ของชื่อด้วย LIKE แทน
+    """
+    text = _normalize_query(query)
+    if not text:
+        return []
+    if len(text) < 3:
+        return conn.execute('''
+            SELECT dealID, title, salePrice, savings, dealRating, 0.0 FROM deals
+            WHERE title LIKE ? ESCAPE '\\' ORDER BY dealRating DESC LIMIT ?
+        ''', (text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%", limit)).fetchall()
+
+    results = conn.execute(_SEARCH_SQL, (_phrase(text), SEARCH_MAX_CANDIDATES,
+                                         RATING_WEIGHT, SAVINGS_WEIGHT, limit)).fetchall()
+    if fuzzy and len(results) < limit:
+        terms = _fuzzy_terms(conn, text)
+        if terms:
+            found = {row[0] for row in results}
+            fuzzy_query = " OR ".join(_phrase(term) for term in terms)
+            rows = conn.execute(_SEARCH_SQL, (fuzzy_query, FUZZY_CANDIDATE_BUDGET,
+                                              RATING_WEIGHT, SAVINGS_WEIGHT, limit + len(found)))
+            for row in rows:
+                if row[0] not in found:
+                    results.append(row)
+                    if len(results) >= limit:
+                        break
+    return results